@@ -0,0 +1,200 @@
+#
+# Benchmark suite for the quantum random number generator, Grover's search and the altitude step.
+# Runs on every backend available locally: the qiskit simulator (Aer), the built-in NumPy simulator and classic (pseudo-random) Python.
+#
+# Measures:
+# randomint.randomInt - values per second, for several max values and counts (with and without the entropy pool), and randomint.randomInts.
+#                       Also the extracted bits per shot of the entropy pool and of randomInts (with randomint.extract on).
+# guess - latency and success rate of the cloud's Grover search.
+# altitude - latency of the main loop's altitude step.
+# startup - time to import unicorn.py, and from starting the game to its first prompt. Importing the game must not load qiskit,
+#           and both must stay within their budgets (startupBudget and promptBudget); the benchmark exits with status 1 when they do not,
+#           so it can guard against slow imports, or work on the quantum stack before the first prompt, creeping back in.
+#
+# Results are written as CSV in the same column layout as data/timings.csv (text, machine, minutes, seconds, total), one row per measurement,
+# so they line up with the historical timings.
+#
+# Usage:
+#   python benchmark.py [output.csv] [repeats]
+#   python benchmark.py --startup
+#
+
+import os
+import sys
+import csv
+import time
+import random as pyrandom
+import subprocess
+import engine
+
+startupBudget = 0.5 # Most seconds allowed for importing unicorn.py (the median over the repeats).
+promptBudget = 1.0 # Most seconds allowed from starting unicorn.py to its first prompt (the median over the repeats).
+
+def available():
+  # Returns the backends that can run here, with the machine name used in the results.
+  backends = [('classic', 'classic')]
+  try:
+    import qiskit
+  except ImportError:
+    return backends
+
+  backends.append(('numpy', 'numpy'))
+  try:
+    qiskit.Aer.get_backend('qasm_simulator')
+    backends.append(('sim', 'simulator'))
+  except Exception:
+    pass
+
+  return backends
+
+def measure(function, repeats):
+  # Returns the duration of each call, in seconds.
+  durations = []
+  for i in range(repeats):
+    start = time.time()
+    function()
+    durations.append(time.time() - start)
+
+  return durations
+
+def benchRandom(device, repeats):
+  rows = []
+  if device == 'classic':
+    for maximum in [15, 255, 1023]:
+      for count in [1, 100, 10000]:
+        for seconds in measure(lambda: [pyrandom.randint(0, maximum) for i in range(count)], repeats):
+          rows.append(('randomInt max=' + str(maximum) + ' count=' + str(count) + ': ' + rate(count, seconds) + ' values/s', seconds))
+    return rows
+
+  import randomint
+  randomint.type = device
+  extractors = [(name, extractor, extractor.shots, extractor.extractedBits) for name, extractor in [('entropyPool', randomint.entropyPool.extractor), ('randomInts', randomint.batchExtractor)] if extractor is not None]
+  for pool in [True, False]:
+    randomint.pool = pool
+    for maximum in [15, 255]:
+      for count in [1, 10] if not pool else [1, 100, 1000]:
+        for seconds in measure(lambda: randomint.randomInt(maximum, count), repeats):
+          rows.append(('randomInt max=' + str(maximum) + ' count=' + str(count) + ' pool=' + str(pool) + ': ' + rate(count, seconds) + ' values/s', seconds))
+
+  randomint.pool = True
+  for maximum in [15, 1000]:
+    for count in [1000, 100000]:
+      for seconds in measure(lambda: randomint.randomInts(maximum, count), repeats):
+        rows.append(('randomInts max=' + str(maximum) + ' count=' + str(count) + ': ' + rate(count, seconds) + ' values/s', seconds))
+
+  # The extractors' yield over the runs on this device: usable bits per measured shot (5 raw bits per shot, before debiasing).
+  for name, extractor, shots, bits in extractors:
+    shots, bits = extractor.shots - shots, extractor.extractedBits - bits
+    rows.append(('extractor ' + name + ': ' + str(round(bits / shots, 3) if shots else 0.0) + ' bits/shot', 0.0))
+
+  return rows
+
+def benchGuess(device, repeats):
+  # Latency of the cloud's guess, and how often it finds the secret.
+  provider = engine.ClassicProvider() if device == 'classic' else engine.QuantumProvider(device)
+  state = engine.GameState()
+  rows = []
+  found = 0
+  for i in range(repeats):
+    provider.startMiniGame(state)
+    start = time.time()
+    index, jewel = provider.cloudGuess(state)
+    seconds = time.time() - start
+    found += 1 if index == state.secret else 0
+    rows.append(('guess: ' + str(round(100 * found / (i + 1), 1)) + '% found', seconds))
+
+  return rows
+
+def benchAltitude(device, repeats):
+  provider = engine.ClassicProvider() if device == 'classic' else engine.QuantumProvider(device)
+  goal = provider.goal()
+  return [('altitude step', seconds) for seconds in measure(lambda: provider.fly(pyrandom.randint(0, goal), 150, goal), repeats)]
+
+def benchStartup(repeats):
+  # Time to import unicorn.py in a fresh interpreter. The import exits with status 1 if it loaded qiskit.
+  command = [sys.executable, '-c', 'import sys, unicorn; sys.exit(\'qiskit\' in sys.modules)']
+  eager = []
+  def start():
+    eager.append(subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0)
+
+  return [('import unicorn' + (' (loaded qiskit)' if eager[i] else ''), seconds) for i, seconds in enumerate(measure(start, repeats))]
+
+def benchPrompt(repeats):
+  # Time from starting unicorn.py in a fresh interpreter to its first prompt. The game is stopped as soon as the prompt appears.
+  prompt = b'[up,down,quit]: '
+  missing = []
+  def start():
+    process = subprocess.Popen([sys.executable, 'unicorn.py'], cwd=os.path.dirname(os.path.abspath(__file__)), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    while not output.endswith(prompt):
+      byte = process.stdout.read(1)
+      if not byte:
+        break
+      output += byte
+    process.kill()
+    process.wait()
+    missing.append(not output.endswith(prompt))
+
+  return [('first prompt' + (' (no prompt)' if missing[i] else ''), seconds) for i, seconds in enumerate(measure(start, repeats))]
+
+def checkStartup(rows):
+  # Returns the problems with the startup measurements: qiskit loaded on import, no prompt shown, or a median import time or time to the first prompt over budget.
+  problems = []
+  if any(text.endswith('(loaded qiskit)') for text, seconds in rows):
+    problems.append('importing unicorn.py loaded qiskit')
+  if any(text.endswith('(no prompt)') for text, seconds in rows):
+    problems.append('unicorn.py exited before showing its first prompt')
+
+  for label, what, budget in [('import unicorn', 'importing unicorn.py', startupBudget), ('first prompt', 'the first prompt', promptBudget)]:
+    durations = sorted(seconds for text, seconds in rows if text.startswith(label))
+    median = durations[len(durations) // 2] if durations else 0
+    if median > budget:
+      problems.append(what + ' took ' + str(round(median, 3)) + 's, over the budget of ' + str(budget) + 's')
+
+  return problems
+
+def rate(count, seconds):
+  # Values per second, guarding against the timer resolution.
+  return str(round(count / max(seconds, 1e-9)))
+
+def write(filename, rows):
+  # Write rows of (text, machine, seconds) in the layout of data/timings.csv.
+  with open(filename, 'w', newline='') as f:
+    out = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+    out.writerow(['', 'text', 'machine', 'minutes', 'seconds', 'total'])
+    for i, (text, machine, seconds) in enumerate(rows):
+      out.writerow([str(i + 1), text, machine, float(seconds // 60), round(seconds % 60, 6), round(seconds, 6)])
+
+def report(problems):
+  # Print the problems found by the startup check. Returns True when there are none.
+  for problem in problems:
+    print('Startup budget exceeded: ' + problem + '.')
+
+  return not problems
+
+def startup(repeats = 10):
+  # Check the startup budget only. Returns True when it is met.
+  return report(checkStartup(benchStartup(repeats) + benchPrompt(repeats)))
+
+def main(filename = 'benchmark.csv', repeats = 10):
+  # Run the whole suite and write the results. Returns True when the startup budget is met.
+  rows = []
+  for device, machine in available():
+    print('Benchmarking ' + machine + '.')
+    for bench in [benchRandom, benchGuess, benchAltitude]:
+      rows += [(text, machine, seconds) for text, seconds in bench(device, repeats)]
+
+  startupRows = benchStartup(repeats) + benchPrompt(repeats)
+  rows += [(text, 'python', seconds) for text, seconds in startupRows]
+  write(filename, rows)
+  print('Wrote ' + str(len(rows)) + ' measurements to ' + filename + '.')
+
+  return report(checkStartup(startupRows))
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1 and sys.argv[1] == '--startup':
+    ok = startup()
+  else:
+    ok = main(sys.argv[1] if len(sys.argv) > 1 else 'benchmark.csv', int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+
+  sys.exit(0 if ok else 1)
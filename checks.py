@@ -0,0 +1,56 @@
+#
+# Correctness checks for the parts of the session that are hard to exercise without a real quantum machine.
+# Each check returns a list of problems found (empty when it passes). Run them all with:
+#
+#   python checks.py
+#
+# The script exits with status 1 when any check finds a problem.
+#
+# hedging - a hedged race in which every job fails in the same poll must raise the job's error, not wait forever.
+#
+
+import sys
+import threading
+
+class FailedJob:
+  # A job that has finished with an error.
+  def done(self):
+    return True
+
+  def result(self, timeout = None):
+    raise RuntimeError('job failed')
+
+def checkHedging(timeout = 5):
+  # Returns the problems with waiting on a hedged race whose jobs all fail in the same poll: it should raise the job's error.
+  import session
+  outcome = []
+  def race():
+    try:
+      session.wait([FailedJob(), FailedJob()])
+      outcome.append('returned')
+    except RuntimeError:
+      outcome.append('raised')
+
+  thread = threading.Thread(target=race, daemon=True)
+  thread.start()
+  thread.join(timeout)
+  if not outcome:
+    return ['waiting on failed hedged jobs did not return within ' + str(timeout) + 's']
+
+  return [] if outcome[0] == 'raised' else ['waiting on failed hedged jobs returned a result instead of raising']
+
+checks = [('hedging', checkHedging)]
+
+def main():
+  # Run every check and print its problems. Returns True when they all pass.
+  ok = True
+  for name, check in checks:
+    problems = check()
+    for problem in problems:
+      print(name + ' check failed: ' + problem + '.')
+    ok = ok and not problems
+
+  return ok
+
+if __name__ == '__main__':
+  sys.exit(0 if main() else 1)
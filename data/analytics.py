@@ -0,0 +1,192 @@
+#
+# Analytics program to produce timing metrics for running a quantum computing program
+# on a QisKit simulator versus IBM Q Experience.
+# The metrics include: machine name | runs | min seconds | mean seconds | max seconds | p50 | p95 | p99
+#
+# Logs are streamed line by line in a single pass: each "Request completed in" line is paired with the "Running on" line before it.
+# Percentiles are estimated with a quantile sketch per machine, to within 1% of the true value,
+# and memory stays constant however large the logs grow.
+#
+# With --incremental, the byte offset reached in each log and the sketches are saved to a state file,
+# and the next run only reads the lines appended since.
+#
+# With --tidy, each request is also written to a tidy CSV dataset next to its log (in the layout of timings.csv).
+# The datasets of the logs in this directory are kept in the repository, so they are not rewritten by default.
+#
+# Usage:
+#   python analytics.py [--incremental] [--tidy] [logs...]
+#
+# Without logs, reads timings*.txt next to this program.
+#
+
+import os
+import re
+import sys
+import csv
+import glob
+import json
+import math
+
+state = 'analytics.json' # State file for --incremental.
+percentiles = [0.5, 0.95, 0.99]
+
+running = re.compile(r'Running on (?:the )?(\w+)')
+completed = re.compile(r'Request completed in (\d+\.\d+)m (\d+\.\d+)s')
+
+class Sketch:
+  # A quantile sketch with relative accuracy (DDSketch, Masson et al., 2019): values are counted in buckets whose bounds grow geometrically,
+  # so any quantile is estimated within accuracy of its true value. Request times from milliseconds to hours fit in under a thousand buckets.
+  def __init__(self, accuracy = 0.01):
+    self.accuracy = accuracy
+    self.gamma = (1 + accuracy) / (1 - accuracy)
+    self.counts = {}
+    self.zeros = 0
+    self.count = 0
+
+  def add(self, x):
+    self.count += 1
+    if x <= 0:
+      self.zeros += 1
+    else:
+      index = math.ceil(math.log(x, self.gamma))
+      self.counts[index] = self.counts.get(index, 0) + 1
+
+  def quantile(self, q):
+    # The value at rank q * (count - 1), as the midpoint (in relative terms) of its bucket.
+    if self.count == 0:
+      return float('nan')
+
+    rank = q * (self.count - 1)
+    seen = self.zeros
+    if seen > rank:
+      return 0.0
+    for index in sorted(self.counts):
+      seen += self.counts[index]
+      if seen > rank:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+class Stats:
+  # Running count, min, mean, max and percentiles of the request times for one machine.
+  def __init__(self):
+    self.runs = 0
+    self.total = 0.0
+    self.min = float('inf')
+    self.max = float('-inf')
+    self.sketch = Sketch()
+
+  def add(self, seconds):
+    self.runs += 1
+    self.total += seconds
+    self.min = min(self.min, seconds)
+    self.max = max(self.max, seconds)
+    self.sketch.add(seconds)
+
+  def row(self, name):
+    return [name, self.runs, self.min, self.total / self.runs, self.max] + [self.sketch.quantile(p) for p in percentiles]
+
+  def save(self):
+    return { 'runs': self.runs, 'total': self.total, 'min': self.min, 'max': self.max, 'zeros': self.sketch.zeros, 'buckets': self.sketch.counts }
+
+  @staticmethod
+  def load(values):
+    stats = Stats()
+    stats.runs, stats.total, stats.min, stats.max = values['runs'], values['total'], values['min'], values['max']
+    stats.sketch.count = values['runs']
+    stats.sketch.zeros = values['zeros']
+    stats.sketch.counts = { int(index): count for index, count in values['buckets'].items() }
+
+    return stats
+
+def duration(minutes, seconds):
+  # The request time in seconds. Logs written before the duration was fixed give the minutes as the whole time in minutes (total / 60, to 2 decimals),
+  # alongside the seconds past the minute, so adding them counts the time twice. Those logs are recognised by fractional minutes: the whole minutes
+  # are recovered from the rounded total, and the seconds give the exact remainder.
+  if minutes != int(minutes):
+    return round((minutes * 60 - seconds) / 60) * 60 + seconds
+
+  return minutes * 60 + seconds
+
+def number(x):
+  # A value for the tidy dataset, written as timings.csv writes it: to 2 decimals, and whole numbers without a decimal point.
+  x = round(x, 2)
+  return int(x) if x == int(x) else x
+
+def process(filename, machines, offset = 0, machine = None, rows = 0, tidy = None):
+  # Stream the log from the byte offset, adding each request time to the stats of its machine (and of IBM Q Experience for real machines).
+  # Only complete lines are read, so a log being written to is picked up where it left off. Returns the new offset, the machine of the last
+  # "Running on" line and the number of requests so far, to resume from. Each request is also written to the tidy CSV writer, if given.
+  with open(filename, 'rb') as f:
+    # A log that shrank has been replaced; start it again.
+    f.seek(0, os.SEEK_END)
+    if f.tell() < offset:
+      offset, machine, rows = 0, None, 0
+    f.seek(offset)
+
+    for line in f:
+      if not line.endswith(b'\n'):
+        break
+      offset += len(line)
+      text = line.decode('utf-8', 'replace').strip()
+
+      match = running.search(text)
+      if match:
+        machine = match.group(1)
+        continue
+
+      match = completed.search(text)
+      if match and machine is not None:
+        minutes, seconds = float(match.group(1)), float(match.group(2))
+        total = duration(minutes, seconds)
+        for name in [machine] + (['IBM Q Experience'] if machine.startswith('ibm') else []):
+          machines.setdefault(name, Stats()).add(total)
+        rows += 1
+        if tidy is not None:
+          tidy.writerow([str(rows), match.group(0), machine, number(minutes), number(seconds), number(total)])
+
+  return offset, machine, rows
+
+def summary(machines):
+  # Print a table of the metrics for each machine, with the simulators first and IBM Q Experience last.
+  names = sorted(machines, key=lambda name: (name == 'IBM Q Experience', name.startswith('ibm'), name))
+  print('{:>20} {:>5} {:>8} {:>10} {:>8} {:>8} {:>8} {:>8}'.format('type', 'runs', 'min', 'mean', 'max', 'p50', 'p95', 'p99'))
+  for name in names:
+    row = machines[name].row(name)
+    print('{:>20} {:>5} {:>8.2f} {:>10.4f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f}'.format(*row))
+
+def main(filenames, incremental = False, tidy = False):
+  saved = { 'files': {}, 'machines': {} }
+  if incremental and os.path.exists(state):
+    with open(state) as f:
+      saved = json.load(f)
+
+  machines = { name: Stats.load(values) for name, values in saved['machines'].items() }
+  for filename in filenames:
+    offset, machine, rows = saved['files'].get(filename, (0, None, 0))
+    if os.path.getsize(filename) < offset:
+      # The log has been replaced since the last run.
+      offset = 0
+
+    if not tidy:
+      saved['files'][filename] = process(filename, machines, offset, machine, rows)
+      continue
+
+    # Write the tidy dataset next to the log, appending when resuming.
+    tidyname = re.sub(r'\.\w{3}$', '.csv', filename)
+    fresh = offset == 0 or not os.path.exists(tidyname)
+    with open(tidyname, 'w' if fresh else 'a', newline='') as f:
+      writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+      if fresh:
+        writer.writerow(['', 'text', 'machine', 'minutes', 'seconds', 'total'])
+        offset, machine, rows = 0, None, 0
+      saved['files'][filename] = process(filename, machines, offset, machine, rows, writer)
+
+  if incremental:
+    saved['machines'] = { name: stats.save() for name, stats in machines.items() }
+    with open(state, 'w') as f:
+      json.dump(saved, f)
+
+  summary(machines)
+
+if __name__ == '__main__':
+  arguments = [argument for argument in sys.argv[1:] if argument not in ['--incremental', '--tidy']]
+  main(arguments or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timings*.txt'))), '--incremental' in sys.argv[1:], '--tidy' in sys.argv[1:])
@@ -0,0 +1,487 @@
+#
+# Headless game engine for Flying Unicorn.
+# The game state is a small object and step() applies a single player action to it, returning the next state and the messages to show.
+# Randomness and circuit execution come from a provider, so the same rules can be played on a quantum computer, on the simulator or classically,
+# and sessions can be simulated, batched and benchmarked without a terminal.
+#
+# Providers can also prefetch: while the player decides, the results of their possible next actions are worked out in the background,
+# and step() uses the one matching the action taken.
+#
+# Random numbers from a quantum machine can run over the latency budget (see randomint.EntropyUnavailable). The game carries on without them:
+# the unicorn stays unnamed until a later turn, no mini-game is offered, and the cloud passes its turn, so step() never waits on them for long or fails.
+#
+# Example:
+#   provider = QuantumProvider('numpy')
+#   state = newGame(provider)
+#   state, messages = step(state, 'up', provider)
+#
+
+import math
+import operator
+import random as pyrandom
+import concurrent.futures
+
+def getName(index):
+  names = {
+    1: 'Golden',
+    2: 'Sparkle',
+    3: 'Twilight',
+    4: 'Rainbow',
+    5: 'Mist',
+    6: 'Bow',
+    7: 'Cloud',
+    8: 'Sky',
+    9: 'Magic',
+    10: 'Pixel',
+    11: 'Sprite',
+    12: 'Mansion',
+    13: 'Dark',
+    14: 'Light',
+    15: 'Crimson'
+  }
+
+  return names.get(index, 'Mystery')
+
+# Get the status for the current state of the unicorn.
+def status(altitude):
+  if altitude == 0:
+    return 'is waiting for you on the ground'
+  elif altitude <= 100:
+    return 'is floating gently above the ground'
+  elif altitude <= 200:
+    return 'is hovering just above the evergreen sea of trees'
+  elif altitude <= 300:
+    return 'is approaching the first misty cloud layer'
+  elif altitude <= 400:
+    return 'has soared through the misty pink clouds'
+  elif altitude <= 500:
+    return 'is well above the misty clouds'
+  elif altitude <= 600:
+    return 'You can barely see the evergreen sea of trees from this high up'
+  elif altitude <= 700:
+    return 'is soaring through the sky'
+  elif altitude <= 800:
+    return 'You can see the first glimpse of the golden castle gates just above you'
+  elif altitude <= 900:
+    return 'is nearly at the mystical castle gates'
+  elif altitude < 1000:
+    return 'swiftly glides through the mystical castle gate. You\'re almost there'
+  else:
+    return 'A roar emits from the crowd of excited sky elves, waiting to greet you'
+
+def action(command):
+  command = command.lower()[0]
+
+  switcher = {
+    'u': 150,
+    'd': -150,
+    'q': 0
+  }
+
+  return switcher.get(command, -1)
+
+def jewelRange(secret, count, size = 4):
+  # Give the player a chance against the quantum algorithm by breaking the jewels 1-count into ranges of size choices. Returns the range (low, high) holding the secret.
+  low = (max(secret, 1) - 1) // size * size + 1
+  return low, min(low + size - 1, count)
+
+def run(program, type, shots = 100):
+  # Execute a program quietly and return its counts.
+  import memo
+  import mitigation
+  import replay
+  import session
+  import statevector
+
+  if type == 'numpy':
+    return statevector.run(program, shots)
+  elif type == 'replay':
+    return replay.run(program, shots)
+  elif type != 'real' and memo.enabled:
+    return memo.counts(program, shots)
+  elif type == 'real' and mitigation.enabled:
+    return mitigation.counts(program, session.getBackend(type, program=program, shots=shots), shots)
+
+  return session.execute(program, session.getTarget(type, program=program, shots=shots), shots).get_counts()
+
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=16) # Runs prefetched circuits in the background.
+
+class GameState:
+  # The complete state of one game. Phases are: fly (waiting for up/down/quit), offer (mini-game offered), guess (mini-game in play) and over.
+  # An empty name means the unicorn has not been named yet; None means naming failed, and step() tries again after each turn.
+  # Pending holds the futures prefetched for the next action.
+  __slots__ = ('name', 'altitude', 'goal', 'turns', 'phase', 'won', 'secret', 'low', 'round', 'jewels', 'memory', 'pending')
+
+  def __init__(self, name = '', goal = 1024):
+    self.name = name
+    self.altitude = 0
+    self.goal = goal
+    self.turns = 0
+    self.phase = 'fly'
+    self.won = False
+
+    # Mini-game state.
+    self.secret = 0
+    self.low = 1
+    self.round = 0
+    self.jewels = ()
+    self.memory = ()
+
+    self.pending = {}
+
+  def copy(self):
+    state = GameState.__new__(GameState)
+    for slot in GameState.__slots__:
+      setattr(state, slot, getattr(self, slot))
+
+    return state
+
+  def isOver(self):
+    return self.phase == 'over'
+
+class ClassicProvider:
+  # The rules of unicorn-classic.py, with randomness from a random.Random instance (pass randomint.QuantumRandom() for quantum randomness).
+  jewels = ('amethyst', 'sapphire', 'emerald', 'jade', 'ruby', 'topaz', 'diamond', 'garnet', 'pearl', 'opal', 'amber', 'citrine', 'moonstone', 'quartz')
+  taunt = "Haha, I win, says the mischievous cloud!\nDon't say I didn't warn you!"
+
+  def __init__(self, random = None):
+    self.random = random if random is not None else pyrandom.Random()
+
+  def goal(self):
+    return 1024
+
+  def newName(self):
+    return getName(self.random.randint(1, 16)) + ' ' + getName(self.random.randint(1, 16))
+
+  def status(self, altitude):
+    return status(altitude)
+
+  def action(self, command):
+    return action(command)
+
+  def fly(self, altitude, modifier, goal):
+    # Move the player with some randomness.
+    return max(altitude + modifier + self.random.randint(1, 50), 0)
+
+  def miniGameTriggered(self, altitude):
+    return self.random.randint(1, 16) > 12
+
+  def startMiniGame(self, state):
+    # Choose a secret from all 14 jewels. The cloud remembers which jewels have been ruled out.
+    state.secret = self.random.randint(1, 14)
+    state.low = 1
+    state.jewels = self.jewels
+    state.memory = self.jewels
+
+  def playerMissed(self, state, jewel):
+    # Remove this jewel from the list of available choices for the computer player.
+    state.memory = tuple(name for name in state.memory if name != jewel)
+
+  def cloudGuess(self, state):
+    # The computer's guess is a jewel from the remaining choices. Returns the guessed jewel index (1-based, within all jewels) and name.
+    jewel = state.memory[self.random.randint(1, len(state.memory)) - 1]
+    state.memory = tuple(name for name in state.memory if name != jewel)
+    return self.jewels.index(jewel) + 1, jewel
+
+class QuantumProvider:
+  # The rules of unicorn.py: altitude from a qubit rotation, random numbers from randomint and the cloud's guess from Grover's search.
+  jewels = ('amethyst', 'sapphire', 'emerald', 'jade')
+  taunt = "Haha, I win, says the mischievous cloud!\nDon't say I didn't warn you! After all, I live in the quantum world! =)"
+
+  def __init__(self, device = 'sim', run = run, jewelCount = 14, prefetch = False, background = None):
+    self.device = device
+    self.run = run
+
+    # With prefetch, the next turn's up and down steps (and the cloud's next guess) run in the background with the background run function (run by default).
+    self.prefetch = prefetch
+    self.background = background if background is not None else run
+
+    # The secret is one of jewelCount jewels, which the cloud searches for over enough qubits to hold the count.
+    self.jewelCount = jewelCount
+    self.qubits = max(jewelCount.bit_length(), 2)
+
+    # Amount to add to measurements on real quantum computer to account for error rate, otherwise player can never reach goal due to measurement error even at 100% invert of qubit.
+    # Not needed when the counts are corrected for readout error.
+    import mitigation
+    self.errorBuffer = 90 if device == 'real' and not mitigation.enabled else 0
+    self.shots = 1024
+
+  def goal(self):
+    return 1024 - self.errorBuffer
+
+  def newName(self):
+    from randomint import randomInt
+    return getName(randomInt(15)) + ' ' + getName(randomInt(15))
+
+  def status(self, altitude):
+    return status(altitude)
+
+  def action(self, command):
+    return action(command)
+
+  def theta(self, altitude, modifier, goal):
+    # The rotation of the unicorn qubit: the fraction of the new altitude from the goal.
+    frac = (altitude + modifier) / goal
+    return min(max(frac, 0), 1) * math.pi
+
+  def altitude(self, counts):
+    # The altitude is the number of 1 counts measured.
+    return counts['1'] if '1' in counts else 0
+
+  def fly(self, altitude, modifier, goal, run = None):
+    # Rotate the unicorn qubit by the fraction of the new altitude from the goal.
+    # With packing, the steps of concurrent sessions (and the prefetched up and down steps) share one circuit (one qubit each).
+    import templates
+    import packing
+    run = run if run is not None else self.run
+    theta = self.theta(altitude, modifier, goal)
+    if packing.enabled:
+      counts = packing.submit(theta, run, self.device, self.shots).result()
+    else:
+      counts = run(templates.altitude.bind([theta]), self.device, self.shots)
+    return self.altitude(counts)
+
+  def miniGameTriggered(self, altitude):
+    from randomint import randomInt
+    return randomInt(15) > 10
+
+  def startMiniGame(self, state):
+    # Select a secret 1-jewelCount (drawing again when out of range) and offer the player the range of 4 choices holding it (25% chance).
+    from randomint import randomInt
+    state.secret = 0
+    while not 1 <= state.secret <= self.jewelCount:
+      state.secret = randomInt(self.jewelCount)
+    state.low, high = jewelRange(state.secret, self.jewelCount, len(self.jewels))
+    state.jewels = self.jewels[:high - state.low + 1]
+
+  def playerMissed(self, state, jewel):
+    pass
+
+  def cloudGuess(self, state, run = None):
+    # The computer's guess is a binary number from the total 1-jewelCount range, found with Grover's search.
+    import templates
+    import profiler
+    from randomint import bitsToInt
+    run = run if run is not None else self.run
+    secret = [int(bit) for bit in format(state.secret, '0' + str(self.qubits) + 'b')]
+    results = run(templates.grover(self.qubits).bind(templates.oracleAngles(secret, self.qubits)), self.device, 100)
+    with profiler.phase('parse'):
+      answer = max(results.items(), key=operator.itemgetter(1))[0]
+      index = bitsToInt([int(bit) for bit in answer])
+
+    # Convert the search result index into a jewel name within the selected range.
+    position = index - state.low
+    return index, self.jewels[position] if 0 <= position < len(self.jewels) else 'Mystery'
+
+  def prepare(self, state):
+    # Returns futures for the results of the player's possible next actions, started in the background while they decide.
+    if not self.prefetch:
+      return {}
+
+    import packing
+    if state.phase == 'fly':
+      modifiers = [self.action('up'), self.action('down')]
+      if packing.enabled:
+        # Pack the up and down steps into one circuit and run it straight away, instead of waiting for the packing window to close.
+        # This also runs the steps other sessions have pending, so they share the circuit but not the rest of their window.
+        counts = { modifier: packing.submit(self.theta(state.altitude, modifier, state.goal), self.background, self.device, self.shots) for modifier in modifiers }
+        packing.flush()
+        return { modifier: executor.submit(lambda future: self.altitude(future.result()), counts[modifier]) for modifier in modifiers }
+
+      return { modifier: executor.submit(self.fly, state.altitude, modifier, state.goal, self.background) for modifier in modifiers }
+    elif state.phase == 'guess':
+      return { 'guess': executor.submit(self.cloudGuess, state.copy(), self.background) }
+
+    return {}
+
+def prepare(state, provider):
+  # Start prefetching for the next action, with providers that prefetch.
+  if not state.isOver() and hasattr(provider, 'prepare'):
+    state.pending = provider.prepare(state)
+
+def discard(pending):
+  # Cancel prefetched results that are no longer needed. Runs already in flight finish in the background and their results are dropped.
+  for future in pending.values():
+    future.cancel()
+
+def randomName(provider):
+  # Returns a random name for the unicorn, or None if the random numbers cannot be served in time.
+  from randomint import EntropyUnavailable
+  try:
+    return provider.newName()
+  except EntropyUnavailable:
+    return None
+
+def newGame(provider, name = None):
+  # Create a new game, with a random name for the unicorn (or the given name; '' leaves the unicorn unnamed for now).
+  state = GameState(randomName(provider) if name is None else name, provider.goal())
+  prepare(state, provider)
+  return state
+
+def intro(state):
+  return [
+    '================',
+    ' Flying Unicorn',
+    '================',
+    '',
+    'Your majestic unicorn' + (', ' + state.name + ',' if state.name else '') + ' is ready for flight!',
+    'After a long night of preparation and celebration, it\'s time to visit the castle in the clouds.',
+    'Use your keyboard to fly up or down on a quantum computer, as you ascend your way into the castle.',
+    ''
+  ]
+
+def prompt(state, provider):
+  # The input prompt for the current phase of the game.
+  if state.phase == 'fly':
+    return "\n=====================\n-[ Altitude " + str(state.altitude) + " feet ]-\n" + (state.name or 'Your unicorn') + " " + provider.status(state.altitude) + ".\n[up,down,quit]: "
+  elif state.phase == 'offer':
+    return "Do you want to play his game? [yes,no]: "
+  elif state.phase == 'guess':
+    return "Round " + str(state.round) + ". Which unicorn jewel is the real one? [" + ','.join(state.jewels) + "]: "
+
+  return ''
+
+def summary(state):
+  return "The game ended in " + str(state.turns) + " rounds. " + ("You won, great job! :)" if state.won else "Better luck next time. :(")
+
+def checkGoal(state, messages):
+  # Did the player reach the castle?
+  if state.altitude >= state.goal:
+    messages.append('Congratulations! ' + (state.name or 'Your unicorn') + ' soars into the castle gates!')
+    state.won = True
+    state.phase = 'over'
+
+def endMiniGame(state, bonus, messages):
+  # Apply the bonus (or penalty) to the altitude and return to flying.
+  state.altitude = max(state.altitude + bonus, 0)
+  state.phase = 'fly'
+  checkGoal(state, messages)
+
+def fly(state, command, provider, messages, pending):
+  from randomint import EntropyUnavailable
+  if command not in ('u', 'd', 'q', 'up', 'down', 'quit'):
+    return
+
+  # Process input.
+  modifier = provider.action(command)
+  if modifier == 0:
+    state.phase = 'over'
+    return
+
+  if modifier > 0:
+    messages.append("You soar into the sky.")
+  elif state.altitude > 0:
+    messages.append("You dive down lower.")
+  else:
+    messages.append("Your unicorn can't fly into the ground!")
+
+  state.turns = state.turns + 1
+  future = pending.pop(modifier, None)
+  try:
+    state.altitude = future.result() if future is not None else provider.fly(state.altitude, modifier, state.goal)
+  except EntropyUnavailable:
+    # Without random numbers, the unicorn moves by the modifier alone.
+    state.altitude = max(state.altitude + modifier, 0)
+
+  checkGoal(state, messages)
+  if state.phase == 'fly' and state.altitude > 0 and miniGameTriggered(state, provider):
+    # Offer the mini-game, which applies a bonus or penalty to altitude.
+    state.phase = 'offer'
+    messages.append("\n=====================\n-[ Altitude " + str(state.altitude) + " feet ]-\nA mischievous quantum cloud blocks your way and challenges you to a game!")
+    messages.append("He has stolen a magical unicorn jewel from the castle!\nIf you can guess which jewel is the real one before the cloud, you'll be rewarded.\nIf you lose, you'll face a penalty.")
+
+def miniGameTriggered(state, provider):
+  # Without random numbers, the mini-game is skipped.
+  from randomint import EntropyUnavailable
+  try:
+    return provider.miniGameTriggered(state.altitude)
+  except EntropyUnavailable:
+    return False
+
+def offer(state, command, provider, messages):
+  if command[:1] != 'y':
+    endMiniGame(state, 0, messages)
+    return
+
+  from randomint import EntropyUnavailable
+  try:
+    provider.startMiniGame(state)
+  except EntropyUnavailable:
+    # Without random numbers, no jewel can be chosen.
+    messages.append("The mischievous cloud blinks his eyes, but nothing happens. He drifts away, grumbling.")
+    endMiniGame(state, 0, messages)
+    return
+
+  messages.append("The mischievous cloud blinks his eyes. You hear a crack of thunder. A unicorn jewel has been chosen.")
+  state.round = 1
+  state.phase = 'guess'
+
+def guess(state, command, provider, messages, pending):
+  if command not in state.jewels:
+    return
+
+  # Check if the player guesses the correct jewel. The selected index is 1-based to match our secret number, within the selected range.
+  if state.low + state.jewels.index(command) == state.secret:
+    messages.append("You guessed correct!")
+    messages.append("Altitude + 100")
+    endMiniGame(state, 100, messages)
+    return
+
+  messages.append("You guessed wrong.")
+  provider.playerMissed(state, command)
+
+  # Let the computer make a guess.
+  from randomint import EntropyUnavailable
+  future = pending.pop('guess', None)
+  try:
+    index, jewel = future.result() if future is not None else provider.cloudGuess(state)
+  except EntropyUnavailable:
+    # Without random numbers, the cloud passes its turn.
+    messages.append("The mischievous cloud hesitates, and lets you guess again.")
+    state.round = state.round + 1
+    return
+
+  messages.append("The mischievous cloud guesses " + jewel + '.')
+  if index == state.secret:
+    messages.append(provider.taunt)
+    messages.append("Altitude - 100")
+    endMiniGame(state, -100, messages)
+  else:
+    state.round = state.round + 1
+
+def step(state, command, provider):
+  # Apply one player action to the game. Returns the next state (the given state is left unchanged) and the messages to show.
+  # Unrecognized actions leave the state as it was, so the caller can simply prompt again.
+  if state.isOver():
+    return state, []
+
+  state = state.copy()
+  messages = []
+  command = command.strip().lower()
+
+  # Unrecognized actions keep the prefetched results for the same choice.
+  phase, turns, round = state.phase, state.turns, state.round
+  pending, state.pending = dict(state.pending), {}
+  if state.phase == 'fly':
+    fly(state, command, provider, messages, pending)
+  elif state.phase == 'offer':
+    offer(state, command, provider, messages)
+  elif state.phase == 'guess':
+    guess(state, command, provider, messages, pending)
+
+  if state.name is None and state.turns != turns:
+    # Try naming the unicorn again, after a failed attempt.
+    state.name = randomName(provider)
+    if state.name:
+      messages.append('Your majestic unicorn is named ' + state.name + '!')
+
+  if (state.phase, state.turns, state.round) == (phase, turns, round):
+    state.pending = pending
+  else:
+    discard(pending)
+    prepare(state, provider)
+
+  if state.phase == 'over':
+    messages.append(summary(state))
+
+  return state, messages
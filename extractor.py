@@ -0,0 +1,135 @@
+#
+# A streaming randomness extractor with continuous health tests.
+# Takes the raw per-shot measurements from a quantum random number generator and turns them into unbiased bits.
+#
+# Health tests (NIST SP 800-90B) run on the raw bits, before debiasing:
+# Repetition count test - fails when a single value repeats too many times in a row (a stuck qubit).
+# Adaptive proportion test - fails when a value occurs too often within a window of samples (a strongly biased qubit).
+#
+# Debiasing:
+# Von Neumann - reads bits in pairs, outputs the first bit of each 01 or 10 pair and discards 00 and 11 pairs.
+# XOR folding - XORs together groups of bits, reducing any bias left over from correlated bits.
+#
+# All stages are vectorized with NumPy and carry their state across chunks, so measurements can be streamed in any chunk size.
+#
+
+import numpy as np
+import math
+
+class HealthTestFailure(Exception):
+  pass
+
+def repetitionCutoff(entropy, alpha):
+  # The longest run of a single value we allow, given the assessed min-entropy per bit and the false positive probability.
+  return 1 + math.ceil(-math.log(alpha, 2) / entropy)
+
+def proportionCutoff(window, entropy, alpha):
+  # The most occurrences of a value we allow in a window: the critical value of a binomial(window, 2^-entropy) distribution.
+  p = math.pow(2, -entropy)
+  tail = 0.0
+  for count in range(window, 0, -1):
+    tail += math.exp(math.lgamma(window + 1) - math.lgamma(count + 1) - math.lgamma(window - count + 1) + count * math.log(p) + (window - count) * math.log1p(-p))
+    if tail > alpha:
+      return count + 1
+
+  return 1
+
+def vonNeumann(bits):
+  # Keep the first bit of each unequal pair of bits.
+  pairs = bits[:len(bits) - len(bits) % 2].reshape(-1, 2)
+  return pairs[pairs[:, 0] != pairs[:, 1], 0]
+
+def xorFold(bits, factor):
+  # XOR together each group of factor bits.
+  if factor <= 1:
+    return bits
+  groups = bits[:len(bits) - len(bits) % factor].reshape(-1, factor)
+  return np.bitwise_xor.reduce(groups, axis=1)
+
+class Extractor:
+  # A streaming pipeline stage: raw per-shot measurements in, health-tested and debiased bits out.
+  def __init__(self, entropy = 0.5, alpha = math.pow(2, -20), window = 1024, debias = True, fold = 1):
+    self.debias = debias
+    self.fold = fold
+    self.window = window
+    self.repetitionCutoff = repetitionCutoff(entropy, alpha)
+    self.proportionCutoff = proportionCutoff(window, entropy, alpha)
+
+    # State carried between chunks.
+    self.lastValue = -1
+    self.runLength = 0
+    self.windowBits = np.empty(0, dtype=np.uint8)
+    self.pending = np.empty(0, dtype=np.uint8)
+    self.folding = np.empty(0, dtype=np.uint8)
+
+    # Metrics.
+    self.shots = 0
+    self.rawBits = 0
+    self.extractedBits = 0
+    self.failures = 0
+
+  def efficiency(self):
+    # The expected number of extracted bits per raw bit: von Neumann keeps 1 bit out of every 4 and folding divides by the fold factor.
+    return (0.25 if self.debias else 1.0) / max(self.fold, 1)
+
+  def bitsPerShot(self):
+    # The number of usable bits extracted per measured shot, so far.
+    return self.extractedBits / self.shots if self.shots else 0.0
+
+  def repetitionTest(self, bits):
+    # Find the length of every run of equal bits, joining the first run onto the run carried over from the previous chunk.
+    changes = np.flatnonzero(np.diff(bits)) + 1
+    starts = np.concatenate(([0], changes))
+    lengths = np.diff(np.concatenate((starts, [len(bits)])))
+    if bits[0] == self.lastValue:
+      lengths[0] += self.runLength
+
+    longest = lengths.max()
+    self.lastValue = bits[-1]
+    self.runLength = lengths[-1]
+
+    if longest >= self.repetitionCutoff:
+      self.failures += 1
+      raise HealthTestFailure('Repetition count test failed: ' + str(longest) + ' repeated bits.')
+
+  def proportionTest(self, bits):
+    # Count how often the first bit of each complete window occurs in that window. Incomplete windows wait for the next chunk.
+    bits = np.concatenate((self.windowBits, bits))
+    complete = len(bits) - len(bits) % self.window
+    self.windowBits = bits[complete:]
+    if complete == 0:
+      return
+
+    windows = bits[:complete].reshape(-1, self.window)
+    counts = (windows == windows[:, :1]).sum(axis=1)
+    if counts.max() >= self.proportionCutoff:
+      self.failures += 1
+      raise HealthTestFailure('Adaptive proportion test failed: ' + str(counts.max()) + ' of ' + str(self.window) + ' bits equal.')
+
+  def process(self, bits, shots = None):
+    # Run a chunk of raw bits (a flat NumPy array of 0's and 1's) through the pipeline and return the extracted bits.
+    bits = np.asarray(bits, dtype=np.uint8)
+    self.shots += shots if shots is not None else len(bits)
+    self.rawBits += len(bits)
+    if len(bits) == 0:
+      return bits
+
+    self.repetitionTest(bits)
+    self.proportionTest(bits)
+
+    # Debias, carrying over any unpaired bit (or incomplete fold group) to the next chunk.
+    bits = np.concatenate((self.pending, bits))
+    if self.debias:
+      self.pending = bits[len(bits) - len(bits) % 2:]
+      bits = vonNeumann(bits)
+    else:
+      self.pending = bits[:0]
+
+    if self.fold > 1:
+      bits = np.concatenate((self.folding, bits))
+      complete = len(bits) - len(bits) % self.fold
+      self.folding = bits[complete:]
+      bits = xorFold(bits[:complete], self.fold)
+
+    self.extractedBits += len(bits)
+    return bits
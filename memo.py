@@ -0,0 +1,56 @@
+#
+# Outcome-distribution memoization for repeated circuits on the simulator.
+# The game only ever runs a handful of distinct circuits: the Grover search for one of 16 secrets, the altitude step for one angle, and the random number generator.
+# Instead of simulating each run, we compute the exact outcome distribution once per circuit fingerprint and draw multinomial samples from it with NumPy.
+# The results have the same shape as get_counts() (or get_memory()) from the simulator.
+#
+
+import hashlib
+import threading
+from collections import OrderedDict
+import templates
+import statevector
+import profiler
+
+enabled = False # Opt-in: serve simulator runs from memoized distributions.
+size = 256 # Maximum number of distributions to keep, evicting the least recently used.
+
+cache = OrderedDict()
+lock = threading.Lock()
+
+def fingerprint(program):
+  # Identify a circuit. Template bindings are identified by template name and parameter values, other circuits by their QASM.
+  if isinstance(program, templates.Binding):
+    return program.template.name + repr(program.values)
+
+  return hashlib.sha1(program.qasm().encode('utf-8')).hexdigest()
+
+def lookup(program):
+  # Returns the memoized distribution for the program, computing it on a miss.
+  key = fingerprint(program)
+  with lock:
+    if key in cache:
+      cache.move_to_end(key)
+      return cache[key]
+
+  # Compute the exact distribution with the NumPy statevector simulator, outside the lock; a concurrent miss for the same key just computes it twice.
+  entry = statevector.distribution(program.program() if isinstance(program, templates.Binding) else program)
+  with lock:
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > size:
+      cache.popitem(last=False)
+
+  return entry
+
+def counts(program, shots):
+  # Returns a get_counts()-shaped dictionary of shots samples.
+  with profiler.phase('simulate'):
+    probs, width = lookup(program)
+    return statevector.sampleCounts(probs, width, shots)
+
+def memory(program, shots):
+  # Returns a get_memory()-shaped list of shots measurements.
+  with profiler.phase('simulate'):
+    probs, width = lookup(program)
+    return statevector.sampleMemory(probs, width, shots)
@@ -0,0 +1,158 @@
+#
+# Readout-error mitigation for real quantum machines.
+# Each qubit on a real device is sometimes read out wrong: a prepared 0 is measured as 1 (and the other way around) a few percent of the time.
+# Instead of padding the goal with a fixed error buffer, we calibrate each backend once by preparing all 0's and all 1's
+# on the physical qubits a circuit is measured on (taken from its transpiled layout), which gives a 2x2 confusion matrix per qubit,
+# and cache the matrices on disk for a while, per backend and set of physical qubits.
+# Every result is then corrected by applying the inverse of the matrices to the measured distribution, one qubit axis at a time with NumPy.
+#
+# Shots are allocated adaptively, in a single job: before submitting, the circuit's ideal distribution is computed locally with the NumPy simulator,
+# and the job gets just enough shots for the estimate of every outcome's probability to be within tolerance at the target confidence
+# (at most the requested number). Every extra job would pay the full hardware queue wait, so the shots are never topped up afterwards.
+# The corrected counts are scaled to the requested shots, so callers see the same totals as before.
+#
+
+import os
+import json
+import math
+import time
+import threading
+import numpy as np
+import session
+import templates
+import statevector
+import memo
+
+enabled = False # Opt-in: correct counts from real backends for readout error, with adaptive shots.
+path = 'calibration.json' # File to cache the calibration of each backend in.
+expiry = 6 * 60 * 60 # Seconds before a calibration is measured again (devices are recalibrated daily, and drift in between).
+calibrationShots = 1024 # Shots for each of the two calibration circuits.
+confidence = 0.95 # Confidence for the adaptive shot allocation.
+tolerance = 0.035 # Largest acceptable error (half-width of the confidence interval) in any outcome's probability; even p = 0.5 needs only 784 shots.
+minShots = 128 # Fewest shots in an adaptive run.
+
+lock = threading.Lock()
+
+def buildCalibration(qubits, value):
+  # Prepare every qubit in value (0 or 1) and measure them.
+  def build():
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+    qr = QuantumRegister(qubits)
+    cr = ClassicalRegister(qubits)
+    program = QuantumCircuit(qr, cr)
+    if value:
+      program.x(qr)
+    program.measure(qr, cr)
+
+    return program, []
+
+  return build
+
+def calibrationProgram(physical, value):
+  # Returns the calibration circuit preparing value on the physical qubits, measured into classical bits in the same order.
+  name = 'calibration' + str(value) + ':' + ','.join(str(qubit) for qubit in physical)
+  return templates.Template(name, buildCalibration(len(physical), value), list(physical)).bind()
+
+def physicalQubits(program, backend):
+  # Returns the physical qubit measured into each classical bit (bit 0 first) once the program is transpiled for the backend.
+  circuit = program.circuit(backend)
+  measured = {}
+  for instruction, qargs, cargs in circuit.data:
+    if instruction.name == 'measure':
+      measured[circuit.clbits.index(cargs[0])] = circuit.qubits.index(qargs[0])
+
+  return tuple(measured[bit] for bit in sorted(measured))
+
+def marginals(counts, qubits):
+  # Returns the fraction of shots that measured 1 on each classical bit (bit 0 first).
+  ones = np.zeros(qubits)
+  for key, value in counts.items():
+    ones += value * np.array([int(bit) for bit in reversed(key)])
+
+  return ones / sum(counts.values())
+
+def measure(backend, physical):
+  # Measure the confusion matrix of each physical qubit: matrix[measured][prepared].
+  qubits = len(physical)
+  zeros = marginals(session.execute(calibrationProgram(physical, 0), backend, calibrationShots).get_counts(), qubits)
+  ones = marginals(session.execute(calibrationProgram(physical, 1), backend, calibrationShots).get_counts(), qubits)
+  return [[[1 - zeros[i], 1 - ones[i]], [zeros[i], ones[i]]] for i in range(qubits)]
+
+def load():
+  if not os.path.exists(path):
+    return {}
+
+  with open(path) as f:
+    return json.load(f)
+
+def calibration(backend, physical):
+  # Returns the confusion matrices for the physical qubits of the backend (in order), from the cache file while they are fresh and measuring them otherwise.
+  key = backend.name() + ':' + ','.join(str(qubit) for qubit in physical)
+  with lock:
+    cached = load().get(key)
+  if cached is not None and cached['time'] + expiry > time.time():
+    return np.array(cached['matrices'])
+
+  matrices = measure(backend, physical)
+  with lock:
+    entries = load()
+    entries[key] = { 'time': time.time(), 'matrices': matrices }
+    with open(path, 'w') as f:
+      json.dump(entries, f)
+
+  return np.array(matrices)
+
+def correct(counts, matrices):
+  # Returns the corrected probability of every outcome (indexed with classical bit 0 as the least significant bit).
+  qubits = len(matrices)
+  measured = np.zeros(2 ** qubits)
+  for key, value in counts.items():
+    measured[int(key, 2)] = value
+  measured = measured.reshape((2,) * qubits)
+
+  # Classical bit i is on axis qubits - 1 - i. Apply each qubit's inverse along its own axis.
+  for i in range(qubits):
+    axis = qubits - 1 - i
+    measured = np.moveaxis(np.tensordot(np.linalg.inv(matrices[i]), measured, axes=([1], [axis])), 0, axis)
+
+  # The inverse can overshoot into small negative values; clip them and renormalize.
+  probs = np.clip(measured.reshape(-1), 0, None)
+  return probs / probs.sum()
+
+def required(program, shots):
+  # The shots needed for the normal confidence interval of every outcome's probability to be within tolerance, at most shots.
+  # The variance is predicted from the circuit's ideal distribution, or taken at its largest (p = 0.5) if the circuit cannot be simulated locally.
+  try:
+    circuit = program.program() if isinstance(program, templates.Binding) else program
+    probs, width = statevector.distribution(circuit)
+    variance = float(np.max(probs * (1 - probs)))
+  except Exception:
+    variance = 0.25
+
+  z = math.sqrt(2) * inverseErf(confidence)
+  return min(shots, max(minShots, math.ceil(z * z * variance / (tolerance * tolerance))))
+
+def inverseErf(x):
+  # Inverse error function (Winitzki's approximation, accurate to about 2e-3), enough for a confidence level.
+  a = 0.147
+  ln = math.log(1 - x * x)
+  first = 2 / (math.pi * a) + ln / 2
+  return math.copysign(math.sqrt(math.sqrt(first * first - ln / a) - first), x)
+
+def counts(program, backend, shots = 1024, progress = None):
+  # Run the program on the backend with as few shots as meet the target confidence, and return readout-corrected counts scaled to shots.
+  # The correction uses the calibration of the physical qubits the transpiled program measures, so a circuit built by the caller
+  # is wrapped in a template (named by its fingerprint): it is then transpiled once, and the same layout is both run and calibrated.
+  if not isinstance(program, templates.Binding):
+    program = templates.Template('circuit:' + memo.fingerprint(program), lambda circuit = program: (circuit, [])).bind()
+
+  result = session.execute(program, backend, required(program, shots), progress=progress)
+  if getattr(result, 'fallback', False):
+    # The job ran over the latency budget and was served locally, without readout error to correct.
+    return session.fallback(program, shots).get_counts()
+
+  raw = result.get_counts()
+  width = len(next(iter(raw)))
+  probs = correct(raw, calibration(backend, physicalQubits(program, backend)))
+  values = np.round(probs * shots).astype(int)
+  return { format(outcome, '0' + str(width) + 'b'): int(values[outcome]) for outcome in np.flatnonzero(values) }
@@ -0,0 +1,98 @@
+#
+# Qubit packing for altitude steps.
+# Each altitude step measures a single qubit, yet the target devices have 5 to 16 qubits and every job waits in the queue for about a minute.
+# Rotations submitted within a short window (the steps of concurrent sessions, or the up and down steps prefetched for one turn) are packed
+# onto separate qubits of a single circuit, up to width qubits, and run as one job. The marginal counts of each qubit are then handed back to
+# its caller, in the same shape as the counts of a 1-qubit altitude circuit.
+#
+# The qubits are independent (no gates between them), so each marginal has the same distribution as running the step on its own.
+#
+
+import threading
+import concurrent.futures
+import numpy as np
+import templates
+
+enabled = False # Opt-in: pack altitude steps from concurrent sessions and turns into shared circuits.
+window = 0.5 # Seconds to wait for more steps before running a circuit.
+width = 5 # Most unicorns (qubits) per circuit; the smallest target device has 5 qubits.
+
+def marginals(counts, count):
+  # Split the counts of a packed circuit into get_counts()-shaped counts for each qubit.
+  keys = list(counts.keys())
+  values = np.array([counts[key] for key in keys])
+  bits = np.array([[int(bit) for bit in reversed(key)] for key in keys])[:, :count]
+  ones = values.dot(bits)
+  shots = int(values.sum())
+
+  return [{ key: value for key, value in (('0', shots - int(ones[i])), ('1', int(ones[i]))) if value } for i in range(count)]
+
+class Packer:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.pending = {}
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+  def submit(self, theta, run, device, shots):
+    # Add a rotation to the pending circuit for the run function, device and shot count. Returns a future for its counts.
+    future = concurrent.futures.Future()
+    key = (run, device, shots)
+
+    with self.lock:
+      if key not in self.pending:
+        self.pending[key] = []
+        timer = threading.Timer(window, self.flush, [key, self.pending[key]])
+        timer.daemon = True
+        timer.start()
+
+      steps = self.pending[key]
+      steps.append((theta, future))
+      full = len(steps) >= width
+
+    if full:
+      self.flush(key, steps)
+
+    return future
+
+  def flush(self, key, steps = None):
+    # Run the pending circuit for the key now, unless it has already been run (by the timer, or because it filled up).
+    with self.lock:
+      if key not in self.pending or (steps is not None and self.pending[key] is not steps):
+        return
+      steps = self.pending.pop(key)
+
+    self.executor.submit(self.execute, key, steps)
+
+  def flushAll(self):
+    with self.lock:
+      keys = list(self.pending.keys())
+
+    for key in keys:
+      self.flush(key)
+
+  def execute(self, key, steps):
+    run, device, shots = key
+    steps = [(theta, future) for theta, future in steps if future.set_running_or_notify_cancel()]
+    if not steps:
+      return
+
+    try:
+      program = templates.altitudes(len(steps)).bind([theta for theta, future in steps])
+      counts = marginals(run(program, device, shots), len(steps))
+    except Exception as e:
+      for theta, future in steps:
+        future.set_exception(e)
+      return
+
+    for i in range(len(steps)):
+      steps[i][1].set_result(counts[i])
+
+packer = Packer()
+
+def submit(theta, run, device, shots):
+  # Pack the rotation of one unicorn by theta into the next circuit run with run(program, device, shots). Returns a future for its counts.
+  return packer.submit(theta, run, device, shots)
+
+def flush():
+  # Run every pending circuit now, without waiting for the window to close.
+  packer.flushAll()
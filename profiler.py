@@ -0,0 +1,132 @@
+#
+# Phase-level profiling of game turns.
+# The turn and mini-game paths are divided into phases (building circuits, oracle angles, transpiling, waiting on the backend, simulating,
+# parsing results, random numbers and the player's input), each wrapped in a timer. At the end of every turn the time spent in each phase is printed,
+# and optionally appended as a JSON line to a file.
+#
+# Enable with the UNICORN_PROFILE environment variable (or python unicorn.py --profile). Its value is a comma-separated list of options:
+#   timers      - phase timers only (the default for any other value, e.g. UNICORN_PROFILE=1)
+#   cprofile    - also run cProfile over each turn and print the top functions
+#   tracemalloc - also trace memory allocations and print the peak for each turn
+#
+# When disabled, phase() returns a shared no-op context, so the hooks cost a function call and a flag check.
+#
+
+import os
+import sys
+import json
+import time
+import threading
+
+enabled = False # Time the phases of each turn.
+cprofile = False # Run cProfile over each turn.
+memory = False # Trace memory allocations with tracemalloc.
+path = None # File to append each turn's breakdown to, as a JSON line, or None to only print it.
+top = 10 # Number of functions to print from cProfile.
+
+class Idle:
+  # The context returned while profiling is off.
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    return False
+
+idle = Idle()
+
+class Phase:
+  def __init__(self, name):
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *args):
+    record(self.name, time.perf_counter() - self.start)
+    return False
+
+lock = threading.Lock()
+turn = None
+
+def configure(options):
+  # Enable profiling with the options (see above).
+  global enabled, cprofile, memory
+  options = [option.strip().lower() for option in options.split(',')]
+  enabled = True
+  cprofile = 'cprofile' in options
+  memory = 'tracemalloc' in options
+
+  if memory:
+    import tracemalloc
+    tracemalloc.start()
+
+def phase(name):
+  # Time a phase of the current turn: with profiler.phase('transpile'): ...
+  return Phase(name) if enabled else idle
+
+def record(name, seconds):
+  # Add the duration of a phase to the current turn. Phases on background threads (prefetching) count towards the turn they run in.
+  with lock:
+    if turn is not None:
+      total, count = turn['phases'].get(name, (0.0, 0))
+      turn['phases'][name] = (total + seconds, count + 1)
+
+def startTurn(label):
+  # Begin the breakdown of a turn.
+  global turn
+  if not enabled:
+    return
+
+  with lock:
+    turn = { 'label': label, 'start': time.perf_counter(), 'phases': {} }
+
+  if cprofile:
+    import cProfile
+    turn['profile'] = cProfile.Profile()
+    turn['profile'].enable()
+
+  if memory:
+    import tracemalloc
+    turn['memory'] = tracemalloc.get_traced_memory()[0]
+    if hasattr(tracemalloc, 'reset_peak'):
+      tracemalloc.reset_peak()
+
+def endTurn():
+  # Finish the current turn and print (and export) its breakdown.
+  global turn
+  if not enabled or turn is None:
+    return
+
+  with lock:
+    current, turn = turn, None
+  if cprofile:
+    current['profile'].disable()
+
+  seconds = time.perf_counter() - current['start']
+  report = { 'time': time.time(), 'turn': current['label'], 'total': seconds, 'phases': { name: total for name, (total, count) in current['phases'].items() } }
+
+  # Phases can nest (building a template happens within a transpile) and overlap (prefetching), so the percentages need not add up to 100.
+  lines = ['Profile of ' + str(current['label']) + ': ' + str(round(seconds, 4)) + 's']
+  for name, (total, count) in sorted(current['phases'].items(), key=lambda item: -item[1][0]):
+    lines.append('  {:<10} {:>9.4f}s {:>5.1f}% x{}'.format(name, total, 100 * total / seconds if seconds else 0, count))
+
+  if memory:
+    import tracemalloc
+    size, peak = tracemalloc.get_traced_memory()
+    report['allocated'] = size - current['memory']
+    report['peak'] = peak
+    lines.append('  memory: ' + str(round((size - current['memory']) / 1024, 1)) + ' KiB allocated, ' + str(round(peak / 1024, 1)) + ' KiB peak')
+
+  print('\n'.join(lines), file=sys.stderr)
+
+  if cprofile:
+    import pstats
+    pstats.Stats(current['profile'], stream=sys.stderr).sort_stats('cumulative').print_stats(top)
+
+  if path:
+    with open(path, 'a') as f:
+      f.write(json.dumps(report) + '\n')
+
+if os.environ.get('UNICORN_PROFILE'):
+  configure(os.environ['UNICORN_PROFILE'])
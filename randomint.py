@@ -10,42 +10,79 @@
 # Random number generation occurs with just a single CPU cycle on the quantum computer (no loops required).
 #
 
-import qiskit
-from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
-from qiskit import IBMQ
-from configparser import RawConfigParser
+from extractor import Extractor
+import templates
+import session
+import memo
+import statevector
+import replay
+import profiler
+import telemetry
+from collections import deque
+import random as pyrandom
+import numpy as np
+import threading
 import math
+import time
 
-type = 'sim' # Run program on the simulator or real quantum machine.
+type = 'sim' # Run program on the simulator (sim), built-in NumPy simulator (numpy), recorded results (replay) or real quantum machine (real).
+pool = True # Serve random bits from a pre-filled entropy pool instead of running a circuit on every call.
+extract = True # Debias the raw measurements and run continuous health tests on them before handing out bits.
+retryDelay = 5.0 # Seconds to wait before trying again to refill the entropy pool after a failed run.
 
-def run(program, type, shots = 1, silent = False):
-  if type == 'real':
-    # Setup the API key for the real quantum computer.
-    parser = RawConfigParser()
-    parser.read('config.ini')
+class EntropyUnavailable(Exception):
+  # Random bits cannot be served in time: the quantum machine ran over the latency budget (or failed), and the pool holds too few bits.
+  pass
 
-    # Read configuration values.
-    proxies = ast.literal_eval(parser.get('IBM', 'proxies')) if parser.has_option('IBM', 'proxies') else None
-    verify = (True if parser.get('IBM', 'verify') == 'True' else False) if parser.has_option('IBM', 'verify') else True
-    token = parser.get('IBM', 'key')
+def run(program, type, shots = 1, silent = False, memory = False):
+  if type == 'real':
+    # Set the backend server. The session authenticates once and caches the backend.
+    backend = session.getTarget('real', 'least_busy', program)
 
-    IBMQ.enable_account(token = token, proxies = proxies, verify = verify)
-    run.isInit = True
+    # Execute the program on the quantum machine (or race it on several, when hedging).
+    # Real machines reject jobs over their max_shots (8192 on the ibmqx devices), so larger runs are split into several jobs.
+    targets = backend if isinstance(backend, list) else [backend]
+    if not silent:
+      print("Running on", ', '.join(target.name() for target in targets))
+    # Results served locally past the latency budget are not quantum random bits, so they are never used.
+    from qiskit.providers import JobTimeoutError
+    limit = min(getattr(target.configuration(), 'max_shots', None) or shots for target in targets)
+    results = []
+    for done in range(0, shots, limit):
+      try:
+        result = session.execute(program, backend, min(limit, shots - done), memory)
+      except JobTimeoutError as e:
+        raise EntropyUnavailable(str(e)) from e
+      if getattr(result, 'fallback', False):
+        raise EntropyUnavailable('The job took longer than the budget of ' + str(session.budget) + 's.')
+      results.append(result)
 
-    # Set the backend server.
-    backend = qiskit.providers.ibmq.least_busy(qiskit.IBMQ.backends(simulator=False))
+    if memory:
+      return [measurement for result in results for measurement in result.get_memory()]
 
-    # Execute the program on the quantum machine.
+    counts = {}
+    for result in results:
+      for key, value in result.get_counts().items():
+        counts[key] = counts.get(key, 0) + value
+    return counts
+  elif type == 'replay':
+    # Serve the result recorded for the program in an earlier session.
     if not silent:
-      print("Running on", backend.name())
-    job = qiskit.execute(program, backend)
-    return job.result().get_counts()
+      print("Replaying from", replay.path)
+    return replay.run(program, shots, memory)
+  elif type == 'numpy':
+    # Execute the program in the built-in NumPy statevector simulator.
+    if not silent:
+      print("Running on the NumPy simulator.")
+    return statevector.run(program, shots, memory)
   else:
     # Execute the program in the simulator.
     if not silent:
       print("Running on the simulator.")
-    job = qiskit.execute(program, qiskit.Aer.get_backend('qasm_simulator'), shots=shots)
-    return job.result().get_counts()
+    if memo.enabled:
+      return memo.memory(program, shots) if memory else memo.counts(program, shots)
+    result = session.execute(program, session.getBackend('sim'), shots, memory)
+    return result.get_memory() if memory else result.get_counts()
 
 def bitCount(value):
   # Returns the number of bits needed to represent the integer value.
@@ -59,7 +96,137 @@ def bitsToInt(bits):
 
   return out
 
+def memoryToBits(memory):
+  # Convert a list of per-shot measurements (bitstrings such as '01101') into a flat NumPy array of 0's and 1's.
+  return np.frombuffer(''.join(memory).encode('ascii'), dtype=np.uint8) - ord('0')
+
+def packBits(bits, width):
+  # Pack a flat array of bits into integers of width bits each (most significant bit first), dropping any leftover bits.
+  bits = bits[:len(bits) - len(bits) % width].reshape(-1, width).astype(np.int64)
+  return bits.dot(np.left_shift(1, np.arange(width - 1, -1, -1, dtype=np.int64)))
+
+def bitWidth(max):
+  # Returns the number of random bits produced for the maximum value: 2^x bits, where x is the number of qubits used by random().
+  return int(math.pow(2, math.ceil(math.log(bitCount(max), 2))))
+
+def reportYield(source, extractor, shots, bits):
+  # With telemetry on, record how many usable bits the extractor produced per measured shot, for this run and so far.
+  if telemetry.enabled:
+    telemetry.emit({ 'time': time.time(), 'source': source, 'shots': shots, 'bits': bits, 'bitsPerShot': bits / shots if shots else 0.0, 'totalBitsPerShot': extractor.bitsPerShot() })
+
+class EntropyPool:
+  # A pool of quantum random bits held in memory.
+  # A background thread refills the pool with one large circuit execution whenever it drops below the low watermark,
+  # topping it up to the high watermark. Callers draw bits from memory without running a circuit themselves.
+  # When a refill fails (for example, the job ran over the latency budget), the bits left in the pool are still served
+  # and the refill is tried again after retryDelay seconds; meanwhile, callers needing more bits than the pool holds get EntropyUnavailable.
+  def __init__(self, low = 512, high = 8192, qubits = 5, shots = 1024, extractor = None):
+    self.low = low
+    self.high = high
+    self.qubits = qubits
+    self.shots = shots
+    self.extractor = extractor
+    self.bits = deque()
+    self.condition = threading.Condition()
+    self.thread = None
+    self.error = None
+
+  def fill(self):
+    # Place all qubits into superposition and record the measurement of every shot, yielding qubits * shots random bits.
+    program = templates.hadamard(self.qubits).bind()
+    memory = run(program, type, self.shots, True, memory=True)
+    bits = memoryToBits(memory)
+    if self.extractor is not None:
+      bits = self.extractor.process(bits, len(memory))
+      reportYield('entropyPool', self.extractor, len(memory), len(bits))
+
+    return bits.tolist()
+
+  def refill(self):
+    while True:
+      # Sleep until the pool drops below the low watermark.
+      with self.condition:
+        while len(self.bits) >= self.low:
+          self.condition.wait()
+
+      # Top up the pool to the high watermark. The circuit runs outside the lock, so callers can keep drawing bits meanwhile.
+      while len(self.bits) < self.high:
+        try:
+          bits = self.fill()
+        except Exception as e:
+          # Hand the error to any waiting callers, then try again after a while.
+          with self.condition:
+            self.error = e
+            self.condition.notify_all()
+          time.sleep(retryDelay)
+          continue
+
+        with self.condition:
+          self.error = None
+          self.bits.extend(bits)
+          self.condition.notify_all()
+
+  def start(self):
+    # Start the background refill thread, if it is not already running. Must be called while holding the condition.
+    if self.thread is None:
+      self.thread = threading.Thread(target=self.refill, daemon=True)
+      self.thread.start()
+
+  def take(self, count):
+    # Remove and return a list of count random bits, blocking only if the pool is empty.
+    # The pool never holds more than the high watermark, so larger requests are served in chunks as the pool refills.
+    # If the pool runs dry while its refill is failing, the bits taken are put back and EntropyUnavailable is raised instead of waiting for the retry.
+    bits = []
+    with self.condition:
+      self.start()
+      while True:
+        chunk = min(len(self.bits), count - len(bits))
+        bits.extend(self.bits.popleft() for i in range(chunk))
+        if len(self.bits) < self.low:
+          self.condition.notify_all()
+
+        if len(bits) == count:
+          return bits
+        if self.error is not None:
+          self.bits.extendleft(reversed(bits))
+          raise EntropyUnavailable('The entropy pool could not be refilled: ' + str(self.error)) from self.error
+        self.condition.wait()
+
+entropyPool = EntropyPool(extractor=Extractor() if extract else None)
+batchExtractor = Extractor() if extract else None # Debiases the measurements of randomInts(); its health tests run continuously across batches.
+batchLock = threading.Lock()
+
+class QuantumRandom(pyrandom.Random):
+  # A drop-in replacement for random.Random that draws its bits from a quantum entropy pool.
+  # Only getrandbits() and random() are implemented; randint(), choice(), shuffle(), etc. are built on top of them by random.Random.
+  # Bits are fetched in bulk by the pool, so a single circuit execution serves thousands of draws.
+  def __init__(self, pool = None):
+    self.pool = pool if pool is not None else entropyPool
+    super().__init__()
+
+  def getrandbits(self, k):
+    if k < 0:
+      raise ValueError('number of bits must be non-negative')
+    return bitsToInt(self.pool.take(k)) if k > 0 else 0
+
+  def random(self):
+    # Return a float in [0.0, 1.0) from 53 random bits (the precision of a double).
+    return self.getrandbits(53) * (2 ** -53)
+
+  def seed(self, *args, **kwds):
+    # Quantum randomness cannot be seeded, so seeding is ignored.
+    return None
+
+  def getstate(self, *args, **kwds):
+    raise NotImplementedError('Quantum entropy source does not have state.')
+
+  setstate = getstate
+
 def random(max):
+  # Draw the bits from the entropy pool, when enabled, instead of running a new circuit.
+  if pool:
+    return entropyPool.take(bitWidth(max))
+
   # Number of shots when we run the quantum program.
   shots = 1000
 
@@ -69,17 +236,8 @@ def random(max):
   # Determine how many qubits are required to represent the number of bits, using the formula: 2^x = bits (where x is the number of qubits). For example, a value of 10 requires 4 bits which can be represented with 2 qubits (since 2^2 = 4). A value of 100 requires 7 bits which can be represented with 3 qubits (since 2^3 = 8).
   x = math.ceil(math.log(bits, 2))
 
-  # Create x qubits for the input array.
-  qr = QuantumRegister(x)
-  # Create x registers for the output.
-  cr = ClassicalRegister(x)
-  program = QuantumCircuit(qr, cr)
-
-  # Place all qubits into superposition.
-  program.h(qr)
-
-  # Measure all qubits.
-  program.measure(qr, cr)
+  # Place x qubits into superposition and measure them. The circuit is built and transpiled once, then reused.
+  program = templates.hadamard(x).bind()
 
   # Run the program for 1000 shots.
   results = run(program, type, shots, True)
@@ -100,7 +258,43 @@ def random(max):
 def randomInt(max, count = 1):
   # Generate a random value from 0-max+. Note, this actually produces a max value of the max bits that can be represented for the specified number. For example, 10 uses 4 bits or 2 qubits with a max value of 15.
   randomValues = []
-  for i in range(count):
-    randomValues.append(bitsToInt(random(max)))
+  with profiler.phase('random'):
+    for i in range(count):
+      randomValues.append(bitsToInt(random(max)))
+
+  return randomValues[0] if count == 1 else randomValues
+
+def randomInts(max, count, qubits = 5):
+  # Generate a NumPy array of count random values from 0-max (inclusive) from a single circuit execution.
+  # Each shot measures qubits random bits; the per-shot memory is packed into bitCount(max)-bit integers and values above max are rejected.
+  if max < 0:
+    raise ValueError('max must be non-negative')
+  if max == 0:
+    return np.zeros(count, dtype=np.int64)
+
+  width = bitCount(max)
+  extractor = batchExtractor
+
+  # Request enough candidates to survive rejection sampling (and extraction), with a margin of several standard deviations.
+  acceptance = (max + 1) / math.pow(2, width)
+  expected = count / acceptance
+  candidates = math.ceil(expected + 4 * math.sqrt(expected) + 8)
+  efficiency = extractor.efficiency() if extractor is not None else 1
+  shots = math.ceil(candidates * width / qubits / efficiency)
+
+  program = templates.hadamard(qubits).bind()
+
+  values = np.empty(0, dtype=np.int64)
+  while len(values) < count:
+    # Almost always a single pass; repeat only if rejection sampling left us short.
+    memory = run(program, type, shots, True, memory=True)
+    bits = memoryToBits(memory)
+    if extractor is not None:
+      with batchLock:
+        bits = extractor.process(bits, len(memory))
+      reportYield('randomInts', extractor, len(memory), len(bits))
+
+    candidates = packBits(bits, width)
+    values = np.concatenate((values, candidates[candidates <= max]))
 
-  return randomValues[0] if count == 1 else randomValues
\ No newline at end of file
+  return values[:count]
@@ -0,0 +1,182 @@
+#
+# Record and replay circuit executions, for load testing against captured hardware results.
+# While recording, every execution on a real backend (or the simulator) appends the circuit fingerprint, its counts (or memory) and the observed latency to a capture file.
+# In replay mode (device = 'replay'), runs are served from the capture at full speed, optionally sleeping for the recorded latency to emulate the hardware.
+#
+# The capture is append-only, one record per line: fingerprint, kind (counts or memory), shots, latency in seconds and the JSON result, separated by tabs.
+# It is memory-mapped, and a sidecar index of the offset of each record is kept next to it, so large captures load instantly;
+# results are parsed when they are served.
+#
+
+import os
+import json
+import mmap
+import time
+import hashlib
+import threading
+import numpy as np
+import memo
+import statevector
+
+recording = False # Record every execution on a backend to the capture file.
+path = 'replay.log' # The capture file.
+emulateLatency = False # When replaying, wait for the recorded latency before returning each result.
+fallback = True # When replaying a circuit that was never captured, simulate it with the NumPy simulator instead of failing.
+
+lock = threading.Lock()
+
+# Each record has an entry in a sidecar index file (path + '.idx'): the hash of its key (fingerprint and kind) and its start and end offsets,
+# as three little-endian 64-bit integers. The index always covers a prefix of the capture, so it is loaded with one read instead of scanning the records.
+entry = np.dtype([('key', '<u8'), ('start', '<u8'), ('end', '<u8')])
+
+def keyHash(key):
+  return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+def indexEnd(filename):
+  # The offset in the capture up to which the index file covers it.
+  if not os.path.exists(filename) or os.path.getsize(filename) < entry.itemsize:
+    return 0
+
+  with open(filename, 'rb') as f:
+    f.seek(-entry.itemsize, os.SEEK_END)
+    return int(np.frombuffer(f.read(entry.itemsize), entry)['end'][0]) + 1
+
+def record(program, shots, memory, result, latency):
+  # Append one execution to the capture file, and to its index while the index is complete.
+  kind = 'memory' if memory else 'counts'
+  key = (memo.fingerprint(program) + '\t' + kind).encode('utf-8')
+  line = b'\t'.join([key, str(shots).encode('utf-8'), str(round(latency, 3)).encode('utf-8'), json.dumps(result, separators=(',', ':')).encode('utf-8')]) + b'\n'
+  with lock:
+    with open(path, 'ab') as f:
+      f.seek(0, os.SEEK_END)
+      start = f.tell()
+      f.write(line)
+
+    # A new capture starts a new index; an index that fell behind is caught up by the next reader instead.
+    if start == 0 or indexEnd(path + '.idx') == start:
+      with open(path + '.idx', 'wb' if start == 0 else 'ab') as f:
+        f.write(np.array([(keyHash(key), start, start + len(line) - 1)], entry).tobytes())
+
+class Capture:
+  # A memory-mapped capture file, indexed by fingerprint and kind.
+  def __init__(self, filename):
+    self.filename = filename
+    self.map = None
+    self.reset()
+
+  def reset(self):
+    self.entries = np.empty(0, entry)
+    self.covered = 0 # Offset in the capture up to which records are indexed.
+    self.indexed = 0 # Bytes of the index file read so far.
+    self.positions = {}
+    self.next = {}
+
+  def refresh(self):
+    # Index the records appended since the last refresh: from the index file where it has them, otherwise by scanning the capture.
+    size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+    if size < self.covered:
+      # The capture has been replaced.
+      self.reset()
+    if size == self.covered:
+      return
+
+    # Read the index first, so every entry refers to a record already in the capture when it is mapped.
+    sidecar = self.filename + '.idx'
+    if os.path.exists(sidecar):
+      with open(sidecar, 'rb') as f:
+        f.seek(self.indexed)
+        data = f.read()
+      data = data[:len(data) - len(data) % entry.itemsize]
+      self.indexed += len(data)
+      entries = np.frombuffer(data, entry)
+      entries = entries[entries['start'] >= self.covered]
+      if len(entries):
+        self.entries = np.concatenate((self.entries, entries))
+        self.covered = int(entries['end'][-1]) + 1
+
+    if self.map is not None:
+      self.map.close()
+      self.map = None
+    if size == 0:
+      return
+    with open(self.filename, 'rb') as f:
+      self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Scan the records the index does not have yet (a capture recorded without one, or written by another process).
+    scanned = []
+    offset = self.covered
+    while offset < len(self.map):
+      end = self.map.find(b'\n', offset)
+      if end == -1:
+        # A partly written last record; pick it up on the next refresh.
+        break
+
+      # Only the key (fingerprint and kind) is read while indexing.
+      separator = self.map.find(b'\t', offset, end)
+      separator = self.map.find(b'\t', separator + 1, end)
+      scanned.append((keyHash(self.map[offset:separator]), offset, end))
+      offset = end + 1
+
+    if scanned:
+      scanned = np.array(scanned, entry)
+      self.entries = np.concatenate((self.entries, scanned))
+      self.covered = offset
+
+      # Catch the index file up, unless it has changed since it was read.
+      if (os.path.getsize(sidecar) if os.path.exists(sidecar) else 0) == self.indexed:
+        with open(sidecar, 'ab') as f:
+          f.write(scanned.tobytes())
+        self.indexed += len(scanned.tobytes())
+
+    self.positions = {}
+
+  def find(self, key):
+    # Returns the (start, end) of every record of the key, in the order they were recorded.
+    if key not in self.positions:
+      rows = self.entries[self.entries['key'] == keyHash(key)]
+      # The offsets are converted to ints first: with numpy 1.x, adding an int to a uint64 gives a float, which cannot slice the map.
+      positions = [(int(start), int(end)) for hashed, start, end in rows]
+      # Check the key itself, in case two keys share a hash.
+      self.positions[key] = [(start, end) for start, end in positions if self.map[start:start + len(key) + 1] == key + b'\t']
+
+    return self.positions[key]
+
+  def lookup(self, fingerprint, kind):
+    # Returns the next recorded (latency, result) for the circuit, cycling through all its recordings, or None.
+    key = (fingerprint + '\t' + kind).encode('utf-8')
+    with lock:
+      entries = self.find(key) if self.map is not None else []
+      if not entries:
+        self.refresh()
+        entries = self.find(key) if self.map is not None else []
+      if not entries:
+        return None
+
+      position = self.next.get(key, 0) % len(entries)
+      self.next[key] = position + 1
+      start, end = entries[position]
+      fields = self.map[start:end].decode('utf-8').split('\t')
+
+    return float(fields[3]), json.loads(fields[4])
+
+captures = {}
+
+def capture():
+  if path not in captures:
+    captures[path] = Capture(path)
+
+  return captures[path]
+
+def run(program, shots = 1024, memory = False):
+  # Serve a recorded result for the program: its counts, or its per-shot measurements when memory is set.
+  entry = capture().lookup(memo.fingerprint(program), 'memory' if memory else 'counts')
+  if entry is None:
+    if not fallback:
+      raise LookupError('No recorded result for the circuit ' + memo.fingerprint(program) + ' in ' + path + '.')
+    return statevector.run(program, shots, memory)
+
+  latency, result = entry
+  if emulateLatency:
+    time.sleep(latency)
+
+  return result
@@ -0,0 +1,114 @@
+#
+# Micro-batching scheduler for circuit executions.
+# Each job on IBM Q waits in the queue for tens of seconds, but a single job may hold many circuits (experiments).
+# Circuits submitted within a short window (altitude steps, random numbers and Grover guesses from concurrent sessions) are collected
+# and sent as a single job, up to the backend's limit of experiments per job. The counts are then handed back to each caller.
+#
+
+import threading
+import concurrent.futures
+import templates
+
+enabled = False # Opt-in: coalesce submissions into batched jobs.
+window = 0.5 # Seconds to wait for more circuits before sending a batch.
+maxExperiments = 75 # Largest batch when the backend does not report its own limit.
+
+class ExperimentResult:
+  # The result of one circuit within a batched job, with the same accessors as a job result.
+  def __init__(self, result, index):
+    self.result = result
+    self.index = index
+
+  def get_counts(self):
+    return self.result.get_counts(self.index)
+
+  def get_memory(self):
+    return self.result.get_memory(self.index)
+
+class BatchedJob:
+  # Stands in for a job until its batch has run. result() blocks like a job's result().
+  def __init__(self, program, shots, memory):
+    self.program = program
+    self.shots = shots
+    self.memory = memory
+    self.future = concurrent.futures.Future()
+
+  def result(self, timeout = None):
+    return self.future.result(timeout)
+
+  def cancel(self):
+    return self.future.cancel()
+
+  def done(self):
+    return self.future.done()
+
+class Scheduler:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.batches = {}
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+  def limit(self, backend):
+    # The most circuits the backend accepts in one job.
+    configuration = backend.configuration()
+    return getattr(configuration, 'max_experiments', None) or maxExperiments
+
+  def submit(self, program, backend, shots = 1024, memory = False):
+    # Add a circuit to the pending batch for the backend (and shot count), starting a new batch if needed.
+    job = BatchedJob(program, shots, memory)
+    key = (backend.name(), shots, memory)
+
+    with self.lock:
+      if key not in self.batches:
+        self.batches[key] = []
+        timer = threading.Timer(window, self.flush, [key, backend, self.batches[key]])
+        timer.daemon = True
+        timer.start()
+
+      batch = self.batches[key]
+      batch.append(job)
+      full = len(batch) >= self.limit(backend)
+
+    if full:
+      self.flush(key, backend, batch)
+
+    return job
+
+  def flush(self, key, backend, batch):
+    # Send the batch, unless it has already been sent (by the timer, or because it filled up).
+    with self.lock:
+      if self.batches.get(key) is not batch:
+        return
+      del self.batches[key]
+
+    # Drop circuits whose callers have cancelled them while waiting.
+    batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+    if batch:
+      self.executor.submit(self.execute, batch, backend)
+
+  def execute(self, batch, backend):
+    import qiskit
+    try:
+      # Template bindings are already transpiled for the backend; other circuits are transpiled here, all at once.
+      circuits = [job.program.circuit(backend) if isinstance(job.program, templates.Binding) else None for job in batch]
+      pending = [i for i in range(len(batch)) if circuits[i] is None]
+      if pending:
+        transpiled = qiskit.transpile([batch[i].program for i in pending], backend)
+        for i, circuit in zip(pending, transpiled if isinstance(transpiled, list) else [transpiled]):
+          circuits[i] = circuit
+
+      qobj = qiskit.assemble(circuits, backend, shots=batch[0].shots, memory=batch[0].memory)
+      result = backend.run(qobj).result()
+    except Exception as e:
+      for job in batch:
+        job.future.set_exception(e)
+      return
+
+    # Hand each caller the result of its own circuit.
+    for i in range(len(batch)):
+      batch[i].future.set_result(ExperimentResult(result, i))
+
+scheduler = Scheduler()
+
+def submit(program, backend, shots = 1024, memory = False):
+  return scheduler.submit(program, backend, shots, memory)
@@ -0,0 +1,113 @@
+#
+# Latency-predictive backend selection.
+# Picking the first backend, or the one with the fewest pending jobs, says little about when a job will actually complete:
+# in the historical timings, ibmq_16_melbourne averaged 107s against 48s for ibmqx4.
+# This model learns the latency of each backend from the timings in data/timings*.csv and from every execution since, and predicts
+# the completion time of a circuit as the expected queue time plus a run time that grows with the circuit's size (shots x depth).
+#
+# The queue time is an exponentially weighted average, so it follows a backend as its queue changes. The run time is a least-squares line
+# fitted online with the same forgetting. Backends with no history are predicted at the average of the others, so they get tried.
+#
+
+import os
+import csv
+import glob
+import threading
+
+enabled = False # Opt-in: choose real backends by predicted completion time.
+history = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'timings*.csv') # Historical timings to learn from at startup.
+alpha = 0.1 # Weight of each new observation (forgetting factor).
+
+class Latency:
+  # The latency model of one backend.
+  def __init__(self):
+    self.queue = None
+    self.samples = 0
+
+    # Decayed sums for the least-squares fit of run time against circuit size.
+    self.n = 0.0
+    self.sx = 0.0
+    self.sy = 0.0
+    self.sxx = 0.0
+    self.sxy = 0.0
+
+  def observe(self, queue, run = None, size = None):
+    # Add one execution: the seconds spent queued and, when known, the seconds it ran for and its size.
+    self.samples += 1
+    self.queue = queue if self.queue is None else (1 - alpha) * self.queue + alpha * queue
+
+    if run is not None and size is not None:
+      decay = 1 - alpha
+      self.n = self.n * decay + 1
+      self.sx = self.sx * decay + size
+      self.sy = self.sy * decay + run
+      self.sxx = self.sxx * decay + size * size
+      self.sxy = self.sxy * decay + size * run
+
+  def run(self, size):
+    # Predicted seconds to run a circuit of size.
+    if self.n == 0:
+      return 0.0
+
+    denominator = self.n * self.sxx - self.sx * self.sx
+    slope = max((self.n * self.sxy - self.sx * self.sy) / denominator, 0.0) if denominator > 1e-9 else 0.0
+    intercept = (self.sy - slope * self.sx) / self.n
+    return max(intercept + slope * size, 0.0)
+
+  def predict(self, size):
+    return self.queue + self.run(size)
+
+models = {}
+lock = threading.Lock()
+loaded = False
+
+def analytics():
+  # The log analytics program next to the historical timings (data/analytics.py), which is not a package module.
+  import importlib.util
+  spec = importlib.util.spec_from_file_location('analytics', os.path.join(os.path.dirname(history), 'analytics.py'))
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+def load():
+  # Learn from the historical timings, once. Their durations are counted as queue time, as they were not split into queue and run.
+  # The total column of the older timings counts each request's time twice, so durations are read from the minutes and seconds
+  # with analytics.duration(), as the summary in data/ is.
+  global loaded
+  if loaded:
+    return
+
+  loaded = True
+  duration = analytics().duration
+  for filename in sorted(glob.glob(history)):
+    with open(filename, newline='') as f:
+      for row in csv.DictReader(f):
+        # Only real machines are chosen between; the simulator would drag down the prediction for new ones.
+        if row['machine'] != 'simulator':
+          models.setdefault(row['machine'], Latency()).observe(duration(float(row['minutes']), float(row['seconds'])))
+
+def observe(name, queue, run = None, size = None):
+  # Add one execution on the backend.
+  with lock:
+    load()
+    models.setdefault(name, Latency()).observe(queue, run, size)
+
+def predict(name, size):
+  # Predicted seconds for a circuit of size to complete on the backend.
+  with lock:
+    load()
+    if name in models:
+      return models[name].predict(size)
+
+    known = [model.predict(size) for model in models.values()]
+    return sum(known) / len(known) if known else 0.0
+
+def size(program, shots):
+  # The size of a circuit (or template binding) for the run time model: shots x depth.
+  import templates
+  circuit = program.template.source() if isinstance(program, templates.Binding) else program
+  return shots * circuit.depth()
+
+def rank(backends, size = 1024):
+  # Returns the backends ordered by predicted completion time for a circuit of size, fastest first.
+  return sorted(backends, key=lambda backend: predict(backend.name(), size))
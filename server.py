@@ -0,0 +1,85 @@
+#
+# Flying Unicorn game server.
+# Hosts many concurrent games of the quantum version in one process, over TCP or a Unix socket, using asyncio.
+# Each connection is one game session. The protocol is line based: the server sends the game's messages followed by a prompt, and the client replies with one line (up, down, quit, yes, no or a jewel).
+# Circuit executions (altitude steps, random numbers and Grover guesses) run on a thread pool, so a slow hardware job only holds up its own player.
+#
+# Usage:
+#   python server.py [port or unix socket path] [device]
+#
+# Example:
+#   python server.py 8023 numpy
+#   nc localhost 8023
+#
+
+import sys
+import asyncio
+import concurrent.futures
+import engine
+import randomint
+
+maxSessions = 10000 # Connections beyond this are turned away.
+maxLine = 256 # Longest line accepted from a client, in bytes.
+idleTimeout = 600 # Seconds to wait for a player's input before closing the session.
+workers = 256 # Threads for running circuits; each one may be blocked on a backend for a minute or more on real hardware.
+
+class Server:
+  def __init__(self, device = 'sim'):
+    # The device runs every circuit of the game: altitude steps and Grover guesses, and the random numbers for names, mini-games and secrets.
+    randomint.type = device
+    self.provider = engine.QuantumProvider(device)
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    self.sessions = 0
+
+  async def call(self, function, *args):
+    # Run a blocking call (anything that may execute a circuit) on the thread pool.
+    return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+  async def send(self, writer, lines, prompt = ''):
+    writer.write((''.join(line + '\n' for line in lines) + prompt).encode('utf-8'))
+    # Wait for slow clients to catch up, so the write buffer of a session stays bounded.
+    await writer.drain()
+
+  async def play(self, reader, writer):
+    # The state of a session is just its GameState (a few slots), plus the stream buffers bounded by maxLine.
+    state = await self.call(engine.newGame, self.provider)
+    await self.send(writer, engine.intro(state), engine.prompt(state, self.provider))
+
+    while not state.isOver():
+      line = await asyncio.wait_for(reader.readline(), idleTimeout)
+      if not line:
+        break
+
+      state, messages = await self.call(engine.step, state, line.decode('utf-8', 'replace'), self.provider)
+      await self.send(writer, messages, engine.prompt(state, self.provider))
+
+  async def handle(self, reader, writer):
+    if self.sessions >= maxSessions:
+      await self.send(writer, ['The castle is full. Please try again later.'])
+      writer.close()
+      return
+
+    self.sessions += 1
+    try:
+      await self.play(reader, writer)
+    except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+      # Idle, misbehaving or disconnected clients just end their own session.
+      pass
+    finally:
+      self.sessions -= 1
+      writer.close()
+
+  async def serve(self, address):
+    if address.isdigit():
+      server = await asyncio.start_server(self.handle, port=int(address), limit=maxLine)
+    else:
+      server = await asyncio.start_unix_server(self.handle, path=address, limit=maxLine)
+
+    print('Flying Unicorn server listening on ' + address + '.')
+    async with server:
+      await server.serve_forever()
+
+if __name__ == '__main__':
+  address = sys.argv[1] if len(sys.argv) > 1 else '8023'
+  device = sys.argv[2] if len(sys.argv) > 2 else 'sim'
+  asyncio.run(Server(device).serve(address))
@@ -0,0 +1,267 @@
+#
+# A shared session for running circuits on IBM Q and the simulator.
+# Authenticates with IBM Q once, caches backend handles for a while instead of looking them up on every run,
+# and submits jobs through a lock so the game, the random number generator and background threads can share one connection.
+# qiskit is imported on the first lookup, not when the session module is imported.
+#
+
+import ast
+import json
+import time
+import threading
+import concurrent.futures
+from configparser import RawConfigParser
+import templates
+import scheduler
+import telemetry
+import replay
+import memo
+import selector
+import profiler
+import statevector
+
+ttl = 300 # Number of seconds to keep a real backend handle before looking it up again (queues and availability change over time).
+hedge = 1 # Number of real backends to race each circuit on; the first result is used and the others are cancelled. 1 turns hedging off.
+maxHedges = 4 # Most extra (hedge) jobs in flight at once across all callers; beyond this, circuits run on their first backend only.
+budget = None # Most seconds to wait for a job before cancelling it and serving the result locally (a recorded result, or the NumPy simulator). None waits forever.
+timeoutLog = 'timeouts.jsonl' # File to append a record of every job cancelled over the budget to (whether or not telemetry is enabled), or None.
+interval = 1.0 # Seconds between progress updates while waiting for a job.
+
+lock = threading.Lock()
+submitLock = threading.Lock()
+provider = None
+backends = {}
+hedgesLock = threading.Lock()
+hedges = 0
+timeouts = 0 # Number of jobs cancelled over the budget so far.
+
+def readConfig(filename = 'config.ini'):
+  # Setup the API key for the real quantum computer.
+  parser = RawConfigParser()
+  parser.read(filename)
+
+  # Read configuration values.
+  proxies = ast.literal_eval(parser.get('IBM', 'proxies')) if parser.has_option('IBM', 'proxies') else None
+  verify = (True if parser.get('IBM', 'verify') == 'True' else False) if parser.has_option('IBM', 'verify') else True
+  token = parser.get('IBM', 'key')
+
+  return token, proxies, verify
+
+def getProvider():
+  # Returns the IBM Q provider, authenticating only the first time.
+  global provider
+  with lock:
+    if provider is None:
+      from qiskit import IBMQ
+      token, proxies, verify = readConfig()
+      provider = IBMQ.enable_account(token = token, proxies = proxies, verify = verify)
+
+    return provider
+
+def getCandidates():
+  # Returns the operational real quantum machines, looking them up again every ttl seconds.
+  key = 'real:candidates'
+  now = time.time()
+  with lock:
+    if key in backends and backends[key][1] > now:
+      return backends[key][0]
+
+  candidates = [backend for backend in getProvider().backends(simulator=False) if backend.status().operational]
+  with lock:
+    backends[key] = (candidates, now + ttl)
+
+  return candidates
+
+def circuitSize(program, shots):
+  # The size of the circuit for the latency model, when backends are chosen by predicted completion time.
+  return selector.size(program, shots) if program is not None else shots
+
+def getBackend(type, strategy = 'first', program = None, shots = 1024):
+  # Returns the backend for the environment: the simulator, or a real quantum machine selected by strategy (first or least_busy).
+  # With the selector enabled, real machines are always chosen by the completion time predicted for the program (see selector.py).
+  if type == 'real' and selector.enabled:
+    return selector.rank(getCandidates(), circuitSize(program, shots))[0]
+
+  key = type + ':' + strategy
+  now = time.time()
+  with lock:
+    if key in backends and backends[key][1] > now:
+      return backends[key][0]
+
+  import qiskit
+  if type == 'real':
+    candidates = getProvider().backends(simulator=False)
+    backend = qiskit.providers.ibmq.least_busy(candidates) if strategy == 'least_busy' else candidates[0]
+    expires = now + ttl
+  else:
+    # The simulator never changes, so keep it for good.
+    backend = qiskit.Aer.get_backend('qasm_simulator')
+    expires = float('inf')
+
+  with lock:
+    backends[key] = (backend, expires)
+
+  return backend
+
+def getBackends(type, count, program = None, shots = 1024):
+  # Returns up to count backends for the environment, the least busy (or, with the selector enabled, the fastest predicted) real machines first.
+  # The simulator is a single backend.
+  if type != 'real':
+    return [getBackend(type)]
+
+  if selector.enabled:
+    return selector.rank(getCandidates(), circuitSize(program, shots))[:count]
+
+  return sorted(getCandidates(), key=lambda backend: backend.status().pending_jobs)[:count]
+
+def getTarget(type, strategy = 'first', program = None, shots = 1024):
+  # Returns where to run circuits for the environment: the backends to race when hedging, otherwise the single backend selected by strategy.
+  return getBackends(type, hedge, program, shots) if type == 'real' and hedge > 1 else getBackend(type, strategy, program, shots)
+
+def submit(program, backend, shots = 1024, memory = False):
+  # Submit a program to the backend and return the job, without waiting for it. Safe to call from several threads.
+  # With the scheduler enabled, the program joins a batch of circuits that is sent as one job.
+  if scheduler.enabled:
+    return scheduler.submit(program, backend, shots, memory)
+
+  with submitLock:
+    return templates.execute(program, backend, shots, memory)
+
+class LocalResult:
+  # A result served locally in place of a job that ran over budget, with the same accessors as a job result (counts only).
+  fallback = True
+
+  def __init__(self, counts):
+    self.counts = counts
+
+  def get_counts(self):
+    return self.counts
+
+def fallback(program, shots = 1024):
+  # Serve counts without a backend: the counts recorded for the circuit (see replay.py), if any, otherwise the NumPy simulator.
+  # Per-shot measurements are never served locally: they are random bits, which must come from the quantum machine.
+  entry = replay.capture().lookup(memo.fingerprint(program), 'counts')
+  if entry is not None:
+    telemetry.note(fallback='replay')
+    return LocalResult(entry[1])
+
+  telemetry.note(fallback='numpy')
+  return LocalResult(statevector.run(program, shots))
+
+def recordTimeout(backend, shots, memory):
+  # Record a job cancelled over the budget, in the telemetry record (when enabled) and in the timeout log.
+  global timeouts
+  with lock:
+    timeouts += 1
+  telemetry.note(timeout=budget)
+  if timeoutLog:
+    telemetry.writer(timeoutLog).write(json.dumps({ 'time': time.time(), 'backend': backend, 'shots': shots, 'memory': memory, 'budget': budget }))
+
+def submitHedged(program, backends, shots = 1024, memory = False):
+  # Submit the program to the first backend, and to each of the others while there is room under the hedge cap. Returns the (backend, job) pairs.
+  global hedges
+  jobs = [(backends[0], submit(program, backends[0], shots, memory))]
+  for backend in backends[1:]:
+    with hedgesLock:
+      if hedges >= maxHedges:
+        break
+      hedges += 1
+
+    try:
+      jobs.append((backend, submit(program, backend, shots, memory)))
+    except Exception:
+      # A hedge that cannot be submitted is simply left out of the race.
+      release(1)
+
+  return jobs
+
+def release(count):
+  global hedges
+  with hedgesLock:
+    hedges -= count
+
+def cancel(job):
+  try:
+    job.cancel()
+  except Exception:
+    # Not every backend can cancel a job; it then finishes on its own and its result is dropped.
+    pass
+
+def wait(jobs, timeout = None, progress = None):
+  # Wait for the first of the jobs to finish, calling progress with the seconds waited so far every interval.
+  # Returns the index of the job and its result, or (None, None) if the timeout passes first. A failed job drops out of the race,
+  # and its error is raised only if every job fails.
+  from qiskit.providers import JobTimeoutError
+  start = time.time()
+  pending = list(range(len(jobs)))
+  error = None
+  while True:
+    remaining = None if timeout is None else timeout - (time.time() - start)
+    if remaining is not None and remaining <= 0:
+      return None, None
+    step = interval if remaining is None else min(interval, remaining)
+
+    if len(pending) == 1:
+      try:
+        return pending[0], jobs[pending[0]].result(timeout=step)
+      except (JobTimeoutError, concurrent.futures.TimeoutError):
+        pass
+    else:
+      for i in [i for i in pending if jobs[i].done()]:
+        try:
+          return i, jobs[i].result()
+        except Exception as e:
+          pending.remove(i)
+          error = e
+      if not pending:
+        raise error
+      time.sleep(step)
+
+    if progress is not None:
+      progress(time.time() - start)
+
+def execute(program, backend, shots = 1024, memory = False, progress = None):
+  # Run a program on the backend and wait for its result, recording telemetry for the execution.
+  # Given a list of backends, the program is hedged: it races on all of them (within the hedge cap), the first result is used and the other jobs are cancelled.
+  # Jobs running over the latency budget are cancelled and served locally instead; such results have fallback set.
+  # Per-shot measurements (random bits) are not served locally: past the budget, JobTimeoutError is raised instead.
+  targets = backend if isinstance(backend, list) else [backend]
+  name = '+'.join(target.name() for target in targets)
+  with telemetry.execution(name, shots):
+    start = time.time()
+    jobs = submitHedged(program, targets, shots, memory)
+    submitted = time.time()
+    winner = None
+    try:
+      with profiler.phase('wait'):
+        winner, result = wait([job for target, job in jobs], budget, progress)
+    finally:
+      # Cancel the stragglers (or every job, past the budget) and free their hedge slots.
+      for i in range(len(jobs)):
+        if i != winner:
+          cancel(jobs[i][1])
+      release(len(jobs) - 1)
+
+    if result is None:
+      recordTimeout(name, shots, memory)
+      if memory:
+        from qiskit.providers import JobTimeoutError
+        raise JobTimeoutError('The job took longer than the budget of ' + str(budget) + 's, and random bits are not served locally.')
+      return fallback(program, shots)
+
+    if len(jobs) > 1:
+      telemetry.note(hedges=len(jobs) - 1, winner=jobs[winner][0].name())
+
+    if replay.recording:
+      replay.record(program, shots, memory, result.get_memory() if memory else result.get_counts(), time.time() - start)
+
+    # The backend reports how long the experiment ran; the rest of the wait was spent in the queue.
+    waited = time.time() - submitted
+    run = getattr(result, 'time_taken', None) or 0.0
+    if selector.enabled and not getattr(jobs[winner][0].configuration(), 'simulator', False):
+      selector.observe(jobs[winner][0].name(), max(waited - run, 0.0), run, circuitSize(program, shots))
+
+    if telemetry.enabled:
+      telemetry.note(queue=max(waited - run, 0.0), run=run, resultSize=len(result.get_memory() if memory else result.get_counts()))
+
+  return result
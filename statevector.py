@@ -0,0 +1,123 @@
+#
+# A lightweight statevector simulator in pure NumPy.
+# Every circuit in this game is at most a few qubits wide, so we can simulate them directly instead of starting up qiskit.Aer.
+# Supports the gates used by the game: h, x, rx, u1, u3, cx, cu1, ccx and mcu1 (with any number of controls), plus barrier and measure.
+# Measurements are assumed to be at the end of the circuit; shots are then sampled in bulk from the final probabilities.
+#
+
+import math
+import cmath
+import time
+import numpy as np
+import templates
+import telemetry
+import profiler
+
+# Single qubit gate matrices.
+H = np.array([[1, 1], [1, -1]], dtype=complex) / math.sqrt(2)
+X = np.array([[0, 1], [1, 0]], dtype=complex)
+
+def u1(lam):
+  return np.array([[1, 0], [0, cmath.exp(1j * lam)]], dtype=complex)
+
+def u3(theta, phi, lam):
+  return np.array([
+    [math.cos(theta / 2), -cmath.exp(1j * lam) * math.sin(theta / 2)],
+    [cmath.exp(1j * phi) * math.sin(theta / 2), cmath.exp(1j * (phi + lam)) * math.cos(theta / 2)]
+  ], dtype=complex)
+
+def rx(theta):
+  return np.array([
+    [math.cos(theta / 2), -1j * math.sin(theta / 2)],
+    [-1j * math.sin(theta / 2), math.cos(theta / 2)]
+  ], dtype=complex)
+
+def matrix(name, params):
+  # Returns the 2x2 matrix for a single qubit gate (or the target of a controlled gate).
+  params = [float(param) for param in params]
+  if name in ('h', 'ch'):
+    return H
+  elif name in ('x', 'cx', 'ccx'):
+    return X
+  elif name in ('u1', 'cu1', 'mcu1'):
+    return u1(params[0])
+  elif name in ('u3', 'cu3'):
+    return u3(params[0], params[1], params[2])
+  elif name in ('rx', 'crx'):
+    return rx(params[0])
+
+  raise ValueError('Unsupported gate for the NumPy statevector simulator: ' + name)
+
+def apply(state, gate, axis, controls = []):
+  # Apply a 2x2 gate to the qubit on axis, on the slice of the state where every control qubit is 1.
+  index = [slice(None)] * state.ndim
+  for control in controls:
+    index[control] = 1
+  index = tuple(index)
+
+  # Slicing removes the control axes, so shift the target axis down by the number of control axes before it.
+  target = axis - sum(1 for control in controls if control < axis)
+  block = state[index]
+  state[index] = np.moveaxis(np.tensordot(gate, block, axes=([1], [target])), 0, target)
+
+def simulate(circuit):
+  # Returns the final statevector of the circuit as a tensor with one axis per qubit (qubit 0 on the last axis).
+  n = circuit.num_qubits
+  qubits = { qubit: i for i, qubit in enumerate(circuit.qubits) }
+  state = np.zeros((2,) * n, dtype=complex)
+  state[(0,) * n] = 1
+
+  for instruction, qargs, cargs in circuit.data:
+    name = instruction.name
+    if name in ('measure', 'barrier', 'id'):
+      continue
+
+    # Qubit i is stored on axis n - 1 - i, so that the flattened state is indexed with qubit 0 as the least significant bit.
+    axes = [n - 1 - qubits[qubit] for qubit in qargs]
+    apply(state, matrix(name, instruction.params), axes[-1], axes[:-1])
+
+  return state
+
+def probabilities(circuit):
+  # Returns the probability of each qubit basis state, indexed with qubit 0 as the least significant bit.
+  return np.abs(simulate(circuit).reshape(-1)) ** 2
+
+def distribution(circuit):
+  # Returns the exact probability of each classical outcome (indexed with classical bit 0 as the least significant bit) and the number of classical bits.
+  probs = probabilities(circuit)
+  qubits = { qubit: i for i, qubit in enumerate(circuit.qubits) }
+  clbits = { clbit: i for i, clbit in enumerate(circuit.clbits) }
+
+  # Map each qubit basis state onto the classical outcome it is measured as.
+  states = np.arange(len(probs))
+  outcomes = np.zeros(len(probs), dtype=np.int64)
+  for instruction, qargs, cargs in circuit.data:
+    if instruction.name == 'measure':
+      outcomes |= ((states >> qubits[qargs[0]]) & 1) << clbits[cargs[0]]
+
+  width = len(clbits)
+  probs = np.bincount(outcomes, weights=probs, minlength=2 ** width)
+  return probs / probs.sum(), width
+
+def sampleCounts(probs, width, shots):
+  # Draw shots samples from the distribution and return a get_counts()-shaped dictionary.
+  samples = np.random.multinomial(shots, probs)
+  return { format(int(outcome), '0' + str(width) + 'b'): int(samples[outcome]) for outcome in np.flatnonzero(samples) }
+
+def sampleMemory(probs, width, shots):
+  # Draw shots samples from the distribution and return a get_memory()-shaped list.
+  samples = np.random.choice(len(probs), size=shots, p=probs)
+  return [format(int(outcome), '0' + str(width) + 'b') for outcome in samples]
+
+def run(program, shots = 1024, memory = False):
+  # Simulate a circuit (or template binding) and return its counts, or its per-shot measurements when memory is set.
+  with telemetry.execution('numpy', shots), profiler.phase('simulate'):
+    start = time.time()
+    circuit = program.program() if isinstance(program, templates.Binding) else program
+    built = time.time()
+    probs, width = distribution(circuit)
+    result = sampleMemory(probs, width, shots) if memory else sampleCounts(probs, width, shots)
+    if telemetry.enabled:
+      telemetry.note(build=built - start, transpile=0.0, queue=0.0, run=time.time() - built, depth=circuit.depth(), width=circuit.width(), resultSize=len(result))
+
+  return result
@@ -0,0 +1,91 @@
+#
+# Structured telemetry for circuit executions.
+# Each execution produces one record with the backend, shots, circuit depth and width, the time spent building, transpiling, queueing and running,
+# and the size of the result. Records are passed to any registered hooks and appended as JSON lines to a log file.
+# The file is written by a background thread from a buffer, so logging never adds latency to the game loop.
+#
+# Example record:
+#   {"time": 1555555555.1, "backend": "ibmqx4", "shots": 1024, "depth": 3, "width": 2, "build": 0.0001, "transpile": 0.0, "queue": 51.2, "run": 7.0, "total": 58.2, "resultSize": 2}
+#
+
+import json
+import time
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+enabled = False # Opt-in: record telemetry for every execution.
+path = 'telemetry.jsonl' # File to append records to, or None to only call the hooks.
+hooks = [] # Functions called with each record (a dictionary).
+
+local = threading.local()
+
+class BufferedWriter:
+  # Appends lines to a file from a background thread, so callers never wait on disk I/O.
+  def __init__(self, filename, interval = 1.0):
+    self.filename = filename
+    self.interval = interval
+    self.lines = queue.SimpleQueue()
+    self.thread = threading.Thread(target=self.loop, daemon=True)
+    self.thread.start()
+    atexit.register(self.flush)
+
+  def write(self, line):
+    self.lines.put(line)
+
+  def flush(self):
+    # Write out everything buffered so far.
+    lines = []
+    while not self.lines.empty():
+      lines.append(self.lines.get())
+
+    if lines:
+      with open(self.filename, 'a') as f:
+        f.write(''.join(line + '\n' for line in lines))
+
+  def loop(self):
+    while True:
+      time.sleep(self.interval)
+      self.flush()
+
+writers = {}
+writersLock = threading.Lock()
+
+def writer(filename):
+  # Returns the buffered writer for the file, starting it on first use.
+  with writersLock:
+    if filename not in writers:
+      writers[filename] = BufferedWriter(filename)
+
+    return writers[filename]
+
+def emit(record):
+  for hook in hooks:
+    hook(record)
+
+  if path:
+    writer(path).write(json.dumps(record))
+
+@contextmanager
+def execution(backend, shots):
+  # Collect a record for one execution. Phases and circuit details are added with note() while it runs, from anywhere on the same thread.
+  if not enabled:
+    yield None
+    return
+
+  record = { 'time': time.time(), 'backend': backend, 'shots': shots }
+  local.record = record
+  start = time.time()
+  try:
+    yield record
+  finally:
+    local.record = None
+    record['total'] = time.time() - start
+    emit(record)
+
+def note(**values):
+  # Add values to the record of the execution in progress on this thread, if any.
+  record = getattr(local, 'record', None)
+  if record is not None:
+    record.update(values)
@@ -0,0 +1,282 @@
+#
+# A cache of pre-transpiled circuit templates.
+# The game runs the same few circuits over and over, differing only in an angle (altitude) or the oracle bits (Grover).
+# Each circuit is built once with parameters in place of those values and transpiled once per backend.
+# At run time we only bind the parameter values, so circuit construction and transpilation stay off the per-turn path.
+# qiskit is only imported when the first circuit is built or run, so importing the game stays fast.
+#
+
+import math
+import time
+import threading
+import telemetry
+import profiler
+
+class Template:
+  # A parameterized circuit, transpiled on first use for each backend. A layout pins each qubit to the physical qubit at the same position.
+  def __init__(self, name, build, layout = None):
+    self.name = name
+    self.build = build
+    self.layout = layout
+    self.program = None
+    self.parameters = None
+    self.circuits = {}
+    self.lock = threading.Lock()
+
+  def source(self):
+    # Returns the untranspiled circuit, building it only the first time.
+    if self.program is None:
+      with self.lock:
+        if self.program is None:
+          with profiler.phase('build'):
+            self.program, self.parameters = self.build()
+
+    return self.program
+
+  def circuit(self, backend):
+    # Returns the transpiled circuit for the backend, building and transpiling it only the first time.
+    key = backend.name()
+    if key not in self.circuits:
+      import qiskit
+      program = self.source()
+      with self.lock:
+        if key not in self.circuits:
+          with profiler.phase('transpile'):
+            self.circuits[key] = qiskit.transpile(program, backend, initial_layout=self.layout)
+
+    return self.circuits[key]
+
+  def bind(self, values = []):
+    # Returns a binding of values to the template parameters, ready to be passed to run().
+    return Binding(self, values)
+
+class Binding:
+  # A template with values for its parameters. The circuit is bound against a backend only at execution time.
+  def __init__(self, template, values):
+    self.template = template
+    self.values = tuple(values)
+
+  def bindTo(self, circuit):
+    if not self.values:
+      return circuit
+
+    return circuit.bind_parameters(dict(zip(self.template.parameters, self.values)))
+
+  def circuit(self, backend):
+    # Returns the transpiled circuit for the backend with the values bound.
+    return self.bindTo(self.template.circuit(backend))
+
+  def program(self):
+    # Returns the untranspiled circuit with the values bound.
+    return self.bindTo(self.template.source())
+
+def execute(program, backend, shots = 1024, memory = False):
+  # Submit a program to the backend and return the job. Template bindings skip transpilation, as their circuit is already transpiled for the backend.
+  import qiskit
+  start = time.time()
+  if isinstance(program, Binding):
+    # Fetch the transpiled template (only transpiled on first use), then bind the values.
+    template = program.template.circuit(backend)
+    transpiled = time.time()
+    with profiler.phase('bind'):
+      circuit = program.bindTo(template)
+    built = time.time()
+  else:
+    # The circuit was built by the caller, so only transpile it.
+    with profiler.phase('transpile'):
+      circuit = qiskit.transpile(program, backend)
+    transpiled = built = time.time()
+
+  if telemetry.enabled:
+    telemetry.note(transpile=transpiled - start, build=built - transpiled, depth=circuit.depth(), width=circuit.width())
+  qobj = qiskit.assemble(circuit, backend, shots=shots, memory=memory)
+  return backend.run(qobj)
+
+def buildAltitude():
+  # A single qubit (the unicorn), rotated by theta and measured. theta = frac * pi for the altitude as a fraction of the goal.
+  from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+  from qiskit.circuit import Parameter
+  theta = Parameter('theta')
+  unicorn = QuantumRegister(1)
+  unicornClassic = ClassicalRegister(1)
+  program = QuantumCircuit(unicorn, unicornClassic)
+  program.u3(theta, 0.0, 0.0, unicorn)
+  program.measure(unicorn, unicornClassic)
+
+  return program, [theta]
+
+def buildAltitudes(count):
+  # Several unicorns in one circuit: qubit i is rotated by its own theta and measured into classical bit i.
+  def build():
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+    from qiskit.circuit import Parameter
+    thetas = [Parameter('theta' + str(i)) for i in range(count)]
+    unicorns = QuantumRegister(count)
+    unicornsClassic = ClassicalRegister(count)
+    program = QuantumCircuit(unicorns, unicornsClassic)
+    for i in range(count):
+      program.u3(thetas[i], 0.0, 0.0, unicorns[i])
+    program.measure(unicorns, unicornsClassic)
+
+    return program, thetas
+
+  return build
+
+def buildHadamard(qubits):
+  # Place all qubits into superposition and measure them.
+  def build():
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+    qr = QuantumRegister(qubits)
+    cr = ClassicalRegister(qubits)
+    program = QuantumCircuit(qr, cr)
+    program.h(qr)
+    program.measure(qr, cr)
+
+    return program, []
+
+  return build
+
+def oracle(program, qr, angles):
+  # Invert the qubits associated with a secret bit of 0. Each qubit gets an rx(angle) gate: rx(pi) inverts it and rx(0) leaves it unchanged.
+  for i in range(len(angles)):
+    program.rx(angles[i], qr[i])
+
+grayLimit = 5 # Most control qubits for the Gray code decomposition of a multi-controlled phase; wider gates use a tree of Toffolis on ancillas.
+
+def grayCode(n):
+  # Returns the n-bit reflected Gray code, skipping 0: successive values differ in exactly one bit.
+  return [i ^ (i >> 1) for i in range(1, 2 ** n)]
+
+def mcu1(program, lam, controls, target, ancillas = []):
+  # Apply a phase of lam to the target when every control qubit is 1 (a multi-controlled u1). With lam = pi this is a multi-controlled Z.
+  if len(controls) == 1:
+    program.cu1(lam, controls[0], target)
+  elif len(controls) <= grayLimit or len(ancillas) < len(controls) - 1:
+    # Gray code decomposition: 2^n - 1 controlled phases of +-lam / 2^(n-1), one per non-empty subset of the controls, with the parity of
+    # each subset computed in place by a CNOT between subsets. No ancillas, but the depth doubles with every control.
+    lam = lam / 2 ** (len(controls) - 1)
+    last = 0
+    for code in grayCode(len(controls)):
+      # The highest set bit holds the parity of the subset.
+      high = code.bit_length() - 1
+      changed = (code ^ last).bit_length() - 1
+      if changed != high:
+        program.cx(controls[changed], controls[high])
+      elif last:
+        # A new highest bit: gather the parity of the rest of the subset onto it.
+        for bit in range(high):
+          if code >> bit & 1:
+            program.cx(controls[bit], controls[high])
+
+      program.cu1(lam if bin(code).count('1') % 2 else -lam, controls[high], target)
+      last = code
+  else:
+    # Compute the AND of the controls into the ancillas as a balanced tree of Toffolis (depth log2(n)), apply a single controlled phase,
+    # then uncompute the tree.
+    gates = []
+    layer = list(controls)
+    free = list(ancillas)
+    while len(layer) > 1:
+      next = []
+      for i in range(0, len(layer) - 1, 2):
+        gates.append((layer[i], layer[i + 1], free[0]))
+        next.append(free.pop(0))
+      next += layer[len(layer) - len(layer) % 2:]
+      layer = next
+
+    for gate in gates:
+      program.ccx(*gate)
+    program.cu1(lam, layer[0], target)
+    for gate in reversed(gates):
+      program.ccx(*gate)
+
+def ancillaCount(qubits):
+  # The number of ancilla qubits used by the phase flip over qubits (qubits - 1 controls).
+  return qubits - 2 if qubits - 1 > grayLimit else 0
+
+def groverIterations(qubits):
+  # The optimal number of Grover iterations for a single secret among 2^qubits values: floor(pi / 4 * sqrt(N)).
+  return max(int(math.pi / 4 * math.sqrt(2 ** qubits)), 1)
+
+def buildGrover(qubits):
+  # Grover's search over qubits bits, with the secret bits given by the oracle angles (one per qubit) and the optimal number of iterations.
+  def build():
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+    from qiskit.circuit import Parameter
+    angles = [Parameter('oracle' + str(i)) for i in range(qubits)]
+    qr = QuantumRegister(qubits)
+    cr = ClassicalRegister(qubits)
+    program = QuantumCircuit(qr, cr)
+    ancillas = []
+    if ancillaCount(qubits):
+      ar = QuantumRegister(ancillaCount(qubits))
+      program.add_register(ar)
+      ancillas = list(ar)
+
+    controls = [qr[i] for i in range(qubits - 1)]
+
+    # Place the qubits into superposition to represent all possible values.
+    program.h(qr)
+
+    for iteration in range(groverIterations(qubits)):
+      # Run oracle on key, flip the phase of the all 1's state, then reverse the inversions by the oracle.
+      oracle(program, qr, angles)
+      mcu1(program, math.pi, controls, qr[qubits - 1], ancillas)
+      oracle(program, qr, angles)
+
+      # Amplification.
+      program.h(qr)
+      program.x(qr)
+      mcu1(program, math.pi, controls, qr[qubits - 1], ancillas)
+      program.x(qr)
+      program.h(qr)
+
+    # Measure the result.
+    program.barrier(qr)
+    program.measure(qr, cr)
+
+    return program, angles
+
+  return build
+
+def oracleAngles(secret, qubits = 4):
+  # Convert a list of secret bits into oracle angles, indexed by qubit. We read bits starting with the right-most value as qubit 0.
+  # Shorter secrets are padded with leading 0's, which leaves their value unchanged.
+  with profiler.phase('oracle'):
+    secret = [0] * (qubits - len(secret)) + list(secret)
+    return [math.pi if bit == 0 else 0.0 for bit in reversed(secret)]
+
+hadamards = {}
+hadamardsLock = threading.Lock()
+
+def hadamard(qubits):
+  # Returns the template for a register of qubits in superposition, creating it once per qubit count.
+  with hadamardsLock:
+    if qubits not in hadamards:
+      hadamards[qubits] = Template('hadamard' + str(qubits), buildHadamard(qubits))
+
+    return hadamards[qubits]
+
+altitudesTemplates = {}
+altitudesLock = threading.Lock()
+
+def altitudes(count):
+  # Returns the template for count unicorns packed into one circuit, creating it once per count.
+  with altitudesLock:
+    if count not in altitudesTemplates:
+      altitudesTemplates[count] = Template('altitude' + str(count), buildAltitudes(count))
+
+    return altitudesTemplates[count]
+
+grovers = {}
+groversLock = threading.Lock()
+
+def grover(qubits = 4):
+  # Returns the template for Grover's search over qubits bits, creating it once per qubit count.
+  with groversLock:
+    if qubits not in grovers:
+      grovers[qubits] = Template('grover' + str(qubits), buildGrover(qubits))
+
+    return grovers[qubits]
+
+altitude = Template('altitude', buildAltitude)
@@ -0,0 +1,188 @@
+#
+# Monte Carlo tournament runner for tuning the game balance.
+# Plays large numbers of scripted games with the rules of unicorn.py (quantum) and unicorn-classic.py (classic) across all cores,
+# and reports the distribution of turns-to-win, the mini-game win rates and the number of games played per second.
+#
+# The quantum rules are played against an exact model of the circuits, so millions of games run without a quantum backend:
+# the altitude qubit measures 1 with probability sin^2(theta / 2), and Grover's search finds the secret with probability sin^2((2k + 1) * asin(1 / sqrt(N))).
+#
+# Usage:
+#   python tournament.py [games] [policy] [workers]
+#
+
+import sys
+import math
+import time
+import random as pyrandom
+import concurrent.futures
+import numpy as np
+import engine
+import templates
+
+maxTurns = 200 # Games still in the air after this many turns count as a loss.
+
+class ClassicModel(engine.ClassicProvider):
+  # The classic rules, with tunable goal, altitude modifier and mini-game trigger odds (a mini-game starts when randint(1, 16) > trigger).
+  def __init__(self, seed, goal = 1024, modifier = 150, trigger = 12):
+    super().__init__(pyrandom.Random(seed))
+    self.goalAltitude = goal
+    self.modifier = modifier
+    self.trigger = trigger
+
+  def goal(self):
+    return self.goalAltitude
+
+  def action(self, command):
+    modifier = engine.action(command)
+    return modifier if modifier in (0, -1) else int(math.copysign(self.modifier, modifier))
+
+  def miniGameTriggered(self, altitude):
+    return self.random.randint(1, 16) > self.trigger
+
+class QuantumModel(engine.QuantumProvider):
+  # The quantum rules, sampled from the exact outcome distributions of the game's circuits with NumPy.
+  # Tunable goal, error buffer, altitude modifier, mini-game trigger odds (a mini-game starts when randomInt(15) > trigger),
+  # jewel count and Grover iterations (by default the optimal count used by the game's circuit).
+  def __init__(self, seed, goal = 1024, errorBuffer = 0, modifier = 150, trigger = 10, jewelCount = 14, iterations = None):
+    super().__init__('model', jewelCount=jewelCount)
+    self.rng = np.random.default_rng(seed)
+    self.errorBuffer = errorBuffer
+    self.goalAltitude = goal
+    self.shots = goal
+    self.modifier = modifier
+    self.trigger = trigger
+
+    # Probability of each outcome of Grover's search: the secret, or any of the other values.
+    n = 2 ** self.qubits
+    iterations = iterations if iterations is not None else templates.groverIterations(self.qubits)
+    self.success = math.sin((2 * iterations + 1) * math.asin(1 / math.sqrt(n))) ** 2
+    self.grover = np.full(n, (1 - self.success) / (n - 1))
+
+  def goal(self):
+    return self.goalAltitude - self.errorBuffer
+
+  def newName(self):
+    return engine.getName(int(self.rng.integers(16))) + ' ' + engine.getName(int(self.rng.integers(16)))
+
+  def action(self, command):
+    modifier = engine.action(command)
+    return modifier if modifier in (0, -1) else int(math.copysign(self.modifier, modifier))
+
+  def fly(self, altitude, modifier, goal):
+    frac = min(max((altitude + modifier) / goal, 0), 1)
+    return int(self.rng.binomial(self.shots, math.sin(frac * math.pi / 2) ** 2))
+
+  def miniGameTriggered(self, altitude):
+    return int(self.rng.integers(16)) > self.trigger
+
+  def startMiniGame(self, state):
+    state.secret = int(self.rng.integers(1, self.jewelCount + 1))
+    state.low, high = engine.jewelRange(state.secret, self.jewelCount, len(self.jewels))
+    state.jewels = self.jewels[:high - state.low + 1]
+
+  def cloudGuess(self, state):
+    # The cloud's guess is the most frequent outcome of 100 shots of Grover's search.
+    probs = self.grover.copy()
+    probs[state.secret] = self.success
+    index = int(np.argmax(self.rng.multinomial(100, probs)))
+    position = index - state.low
+    return index, self.jewels[position] if 0 <= position < len(self.jewels) else 'Mystery'
+
+# Scripted player policies. Each returns the next command for the game state.
+def eager(state, rng):
+  # Always fly up, always accept the mini-game and guess a jewel at random.
+  if state.phase == 'fly':
+    return 'up'
+  elif state.phase == 'offer':
+    return 'yes'
+
+  return state.jewels[int(rng.random() * len(state.jewels))]
+
+def cautious(state, rng):
+  # Always fly up and always decline the mini-game.
+  return 'up' if state.phase == 'fly' else 'no'
+
+def erratic(state, rng):
+  # Fly up two thirds of the time and down otherwise, and accept half of the mini-games.
+  if state.phase == 'fly':
+    return 'up' if rng.random() < 2 / 3 else 'down'
+  elif state.phase == 'offer':
+    return 'yes' if rng.random() < 0.5 else 'no'
+
+  return state.jewels[int(rng.random() * len(state.jewels))]
+
+policies = { 'eager': eager, 'cautious': cautious, 'erratic': erratic }
+models = { 'quantum': QuantumModel, 'classic': ClassicModel }
+
+def playChunk(rules, policy, games, seed, options = {}):
+  # Play a chunk of games in one process and return its aggregated statistics. Nothing is shared between chunks.
+  provider = models[rules](seed, **options)
+  choose = policies[policy]
+  rng = pyrandom.Random(seed)
+
+  turns = np.zeros(maxTurns + 1, dtype=np.int64)
+  stats = { 'games': 0, 'wins': 0, 'miniGames': 0, 'playerWins': 0, 'cloudWins': 0 }
+  for i in range(games):
+    state = engine.newGame(provider)
+    while not state.isOver() and state.turns < maxTurns:
+      phase = state.phase
+      state, messages = engine.step(state, choose(state, rng), provider)
+      if phase == 'offer' and state.phase == 'guess':
+        stats['miniGames'] += 1
+      elif phase == 'guess' and state.phase != 'guess':
+        if 'You guessed correct!' in messages:
+          stats['playerWins'] += 1
+        else:
+          stats['cloudWins'] += 1
+
+    stats['games'] += 1
+    if state.won:
+      stats['wins'] += 1
+      turns[state.turns] += 1
+
+  stats['turns'] = turns
+  return stats
+
+def merge(total, stats):
+  for key, value in stats.items():
+    total[key] = total[key] + value if key in total else value
+
+  return total
+
+def tournament(rules, policy = 'eager', games = 100000, workers = None, chunk = 5000, options = {}):
+  # Play games across all cores in independent chunks and merge the results.
+  start = time.time()
+  total = {}
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = [executor.submit(playChunk, rules, policy, min(chunk, games - offset), offset + 1, options) for offset in range(0, games, chunk)]
+    for future in concurrent.futures.as_completed(futures):
+      merge(total, future.result())
+
+  total['seconds'] = time.time() - start
+  return total
+
+def percentile(histogram, q):
+  # The q-th percentile of a histogram of turn counts.
+  cumulative = np.cumsum(histogram)
+  return int(np.searchsorted(cumulative, q / 100 * cumulative[-1])) if cumulative[-1] else 0
+
+def report(rules, policy, stats):
+  turns = stats['turns']
+  wins = stats['wins']
+  mean = (turns * np.arange(len(turns))).sum() / wins if wins else 0
+  miniGames = stats['miniGames']
+
+  print('=====================')
+  print(rules + ' rules, ' + policy + ' player')
+  print('Games: ' + str(stats['games']) + ' in ' + str(round(stats['seconds'], 2)) + 's (' + str(round(stats['games'] / stats['seconds'])) + ' games/s)')
+  print('Wins: ' + str(round(100 * wins / stats['games'], 2)) + '%')
+  print('Turns to win: mean ' + str(round(mean, 2)) + ', p50 ' + str(percentile(turns, 50)) + ', p90 ' + str(percentile(turns, 90)) + ', p99 ' + str(percentile(turns, 99)) + ', max ' + str(int(np.flatnonzero(turns).max()) if wins else 0))
+  print('Mini-games: ' + str(miniGames) + ' played, player won ' + str(round(100 * stats['playerWins'] / miniGames, 2) if miniGames else 0) + '%, cloud won ' + str(round(100 * stats['cloudWins'] / miniGames, 2) if miniGames else 0) + '%')
+
+if __name__ == '__main__':
+  games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  policy = sys.argv[2] if len(sys.argv) > 2 else 'eager'
+  workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+  for rules in ['quantum', 'classic']:
+    report(rules, policy, tournament(rules, policy, games, workers))